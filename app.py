@@ -1,5 +1,5 @@
 import streamlit as st
-from utils import db
+from utils import db, metrics
 import os
 
 CACHE_INPUT_DIR = 'temp_mineru_input'
@@ -20,6 +20,8 @@ def main():
     st.session_state['role'] = role
     
     st.sidebar.info(f"You are currently in **{role}** mode.")
+    if db.migration_error:
+        st.error(db.migration_error)
     
     st.title("Welcome to the AI-Powered Quality Control System")
     st.info("Please navigate to your dashboard using the links in the sidebar.")
@@ -29,4 +31,5 @@ def main():
 if __name__ == "__main__":
     ensure_cache_dirs_exist()
     db.ensure_data_dir_exists()
+    metrics.start_server()
     main()
\ No newline at end of file
@@ -0,0 +1,63 @@
+#bench_batch_validation
+# Run from the repo root: python -m benchmarks.bench_batch_validation --samples 5000
+
+import argparse
+import contextlib
+import io
+import random
+import time
+
+from utils import ai_processing
+from utils.batch_validation import validate_samples_batch
+
+def make_specs(num_params):
+    specs = []
+    for i in range(num_params):
+        kind = ('numeric_range', 'numeric_max', 'numeric_min')[i % 3]
+        spec = {"name": f"Param {i}", "type": kind, "spec": kind}
+        if kind in ('numeric_range', 'numeric_min'):
+            spec["min"] = 1.0
+        if kind in ('numeric_range', 'numeric_max'):
+            spec["max"] = 2.0
+        specs.append(spec)
+    return specs
+
+def make_samples(num_samples, specs, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            "sample_id": f"SMP-{i}",
+            "material_info": {"name": "Benchmark Material"},
+            "specifications": specs,
+            "production_inputs": {spec["name"]: round(rng.uniform(0.8, 2.2), 3) for spec in specs},
+        }
+        for i in range(num_samples)
+    ]
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare per-sample and batch validation throughput on numeric specs.")
+    parser.add_argument("--samples", type=int, default=5000)
+    parser.add_argument("--params", type=int, default=30)
+    args = parser.parse_args()
+
+    specs = make_specs(args.params)
+    samples = make_samples(args.samples, specs)
+    rows = args.samples * args.params
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        for sample in samples:
+            ai_processing.validate_qc_results(specs, sample["production_inputs"])
+    loop_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    validate_samples_batch(samples, use_llm=False)
+    batch_seconds = time.perf_counter() - start
+
+    print(f"{args.samples} samples x {args.params} parameters ({rows} checks)")
+    print(f"validate_qc_results loop: {loop_seconds:.3f}s ({rows / loop_seconds:,.0f} checks/s)")
+    print(f"validate_samples_batch:   {batch_seconds:.3f}s ({rows / batch_seconds:,.0f} checks/s)")
+    print(f"speedup: {loop_seconds / batch_seconds:.1f}x")
+
+if __name__ == "__main__":
+    main()
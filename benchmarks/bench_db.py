@@ -0,0 +1,95 @@
+#bench_db
+# Run from the repo root: python -m benchmarks.bench_db --sizes 1000 100000
+
+import argparse
+import datetime
+import random
+
+from benchmarks import harness
+from utils import db, sample_cache
+
+PENDING_STATUS = "Sample Ready for Analysis"
+STATUSES = (PENDING_STATUS, "Analysis Complete", "Material Rejected")
+MATERIALS = [f"Material {i:03d}" for i in range(200)]
+# get_samples() loads the whole table; it is left out of the larger runs.
+FULL_SCAN_LIMIT = 100000
+SPECS = [
+    {"name": f"Assay {i}", "spec": "98.0 - 102.0 %", "type": "numeric_range", "min": 98.0, "max": 102.0} for i in range(8)
+] + [
+    {"name": f"Appearance {i}", "spec": "White crystalline powder", "type": "text"} for i in range(4)
+]
+
+def make_sample(index, rng, specs=SPECS, start=datetime.datetime(2023, 1, 1)):
+    # Same shape as the Production Dashboard's submission, with most history already analysed.
+    request_date = start + datetime.timedelta(minutes=index * 3)
+    return {
+        "sample_id": f"SMP-{request_date.strftime('%Y%m%d')}-{index:07d}",
+        "material_info": {"name": rng.choice(MATERIALS), "stage": "S1"},
+        "specifications": specs,
+        "production_inputs": {
+            spec["name"]: round(rng.uniform(97.5, 102.5), 2) if spec["type"] != "text" else "White crystalline powder"
+            for spec in specs
+        },
+        "performed_by": "Benchmark",
+        "status": PENDING_STATUS if rng.random() < 0.05 else rng.choice(STATUSES[1:]),
+        "request_date": request_date.isoformat(),
+        "qc_inputs": {}, "analysis_results": None, "final_decision": None,
+    }
+
+def populate(num_records, seed=0, batch_size=10000):
+    # Bulk load in large transactions; per-row save_sample() is what the submit case measures.
+    rng = random.Random(seed)
+    conn = db._ready_connection()
+    for start in range(0, num_records, batch_size):
+        rows = [db._row_values(make_sample(i, rng)) for i in range(start, min(num_records, start + batch_size))]
+        conn.execute("BEGIN")
+        conn.executemany("INSERT INTO samples (sample_id, status, material, request_date, data) VALUES (?, ?, ?, ?, ?)", rows)
+        conn.execute("COMMIT")
+
+def run(sizes, repeat=20):
+    results = {}
+    for size in sizes:
+        with harness.scratch_dir():
+            harness.log(f"db: loading {size:,} samples...")
+            populate(size)
+            rng = random.Random(1)
+            prefix = f"db/{size}"
+            existing_ids = [row[0] for row in db.get_connection().execute("SELECT sample_id FROM samples ORDER BY RANDOM() LIMIT 200")]
+            counter = iter(range(size, size + 10 * (repeat + 2)))
+
+            results[f"{prefix}/save_sample"] = harness.measure(lambda: db.save_sample(make_sample(next(counter), rng)), repeat)
+            results[f"{prefix}/get_sample"] = harness.measure(lambda: db.get_sample(rng.choice(existing_ids)), repeat)
+            results[f"{prefix}/update_sample"] = harness.measure(
+                lambda: db.update_sample(rng.choice(existing_ids), {"status": "Analysis Complete", "final_decision": "Pass"}), repeat
+            )
+            # The QC Dashboard refresh: material list, first page, page count, then a later page.
+            results[f"{prefix}/get_material_names"] = harness.measure(lambda: db.get_material_names(PENDING_STATUS), repeat)
+            results[f"{prefix}/query_first_page"] = harness.measure(lambda: db.query_samples(status=PENDING_STATUS, limit=20), repeat)
+            results[f"{prefix}/query_filtered_page"] = harness.measure(
+                lambda: db.query_samples(status=PENDING_STATUS, material=rng.choice(MATERIALS),
+                                         date_from=datetime.date(2023, 3, 1), newest_first=True, limit=20), repeat
+            )
+            results[f"{prefix}/count_samples"] = harness.measure(lambda: db.count_samples(status=PENDING_STATUS), repeat)
+            # The same refresh served from the shared cache while nothing changes (an idle dashboard's rerun).
+            results[f"{prefix}/cached_refresh"] = harness.measure(lambda: (
+                sample_cache.get_material_names(PENDING_STATUS),
+                sample_cache.query_samples(status=PENDING_STATUS, limit=20),
+                sample_cache.count_samples(status=PENDING_STATUS),
+            ), repeat)
+            _, cursor = db.query_samples(status=PENDING_STATUS, limit=min(1000, max(20, size // 100)))
+            results[f"{prefix}/query_deep_page"] = harness.measure(lambda: db.query_samples(status=PENDING_STATUS, cursor=cursor, limit=20), repeat)
+            if size <= FULL_SCAN_LIMIT:
+                results[f"{prefix}/get_samples"] = harness.measure(db.get_samples, max(3, repeat // 5), items=size)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark utils.db against synthetic sample histories.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 100000, 1000000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+    results = run(args.sizes, args.repeat)
+    lines, _ = harness.compare(results, harness.load_baseline())
+    print("\n".join(lines))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+#bench_mineru_cache
+# Run from the repo root: python -m benchmarks.bench_mineru_cache
+
+import argparse
+import contextlib
+import io
+import os
+import stat
+import sys
+
+from benchmarks import harness
+from utils import doc_parser, mineru_server
+
+# Stands in for the mineru CLI: writes <out>/<stem>/auto/<stem>.md for each input, like the real one.
+STUB_MINERU = '''import os, sys
+if sys.argv[1] == "--version":
+    print("mineru-stub 1.0")
+    sys.exit(0)
+source, output = sys.argv[2], sys.argv[4]
+paths = [os.path.join(source, name) for name in os.listdir(source)] if os.path.isdir(source) else [source]
+rows = "".join(f"<tr><td>Test {i}</td><td>NMT {i}.0%</td></tr>" for i in range(__ROWS__))
+for path in paths:
+    stem = os.path.splitext(os.path.basename(path))[0]
+    os.makedirs(os.path.join(output, stem, "auto"), exist_ok=True)
+    with open(os.path.join(output, stem, "auto", stem + ".md"), "w", encoding="utf-8") as f:
+        f.write(f"# Specification\\n\\n<table><tr><td>Name of Test</td><td>Specification</td></tr>{rows}</table>\\n")
+'''
+
+class BenchFile(io.BytesIO):
+    # Same interface as Streamlit's UploadedFile, which is a BytesIO with a name and size.
+    def __init__(self, name, data):
+        super().__init__(data)
+        self.name = name
+        self.size = len(data)
+
+def write_stub_mineru(directory, rows=200):
+    script = os.path.join(directory, "mineru_stub.py")
+    with open(script, "w", encoding="utf-8") as f:
+        f.write(STUB_MINERU.replace("__ROWS__", str(rows)))
+    if sys.platform == "win32":
+        executable = os.path.join(directory, "mineru.cmd")
+        with open(executable, "w", encoding="utf-8") as f:
+            f.write(f'@"{sys.executable}" "{script}" %*\n')
+    else:
+        executable = os.path.join(directory, "mineru")
+        with open(executable, "w", encoding="utf-8") as f:
+            f.write(f"#!{sys.executable}\n")
+            with open(script, encoding="utf-8") as source:
+                f.write(source.read())
+        os.chmod(executable, os.stat(executable).st_mode | stat.S_IEXEC)
+    return executable
+
+def run(repeat=20, document_kb=512, rows=200):
+    results = {}
+    with harness.scratch_dir() as directory:
+        executable = write_stub_mineru(directory, rows)
+        doc_parser.get_mineru_executable_path = lambda: executable
+        doc_parser.get_mineru_version.cache_clear()
+        # The CLI path only: the persistent worker needs the real Mineru package.
+        mineru_server.WORKER_ENABLED = False
+        payload = os.urandom(document_kb * 1024)
+        state = {"count": 0}
+
+        def new_document():
+            state["count"] += 1
+            state["file"] = BenchFile(f"spec_{state['count']}.pdf", state["count"].to_bytes(8, "big") + payload)
+
+        results["mineru/cache_miss"] = harness.measure(lambda: doc_parser.get_md_from_file_mineru(state["file"]), repeat, setup=new_document)
+        cached = BenchFile("cached.pdf", b"cached" + payload)
+        with contextlib.redirect_stdout(io.StringIO()):
+            doc_parser.get_md_from_file_mineru(cached)
+        results["mineru/cache_hit"] = harness.measure(lambda: doc_parser.get_md_from_file_mineru(cached), repeat * 5)
+        results["mineru/hash_only"] = harness.measure(lambda: doc_parser.compute_file_hash(cached), repeat * 5)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the Mineru markdown cache hit and miss paths with a stub Mineru CLI.")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--document-kb", type=int, default=512, help="Size of each synthetic upload.")
+    args = parser.parse_args()
+    results = run(args.repeat, args.document_kb)
+    lines, _ = harness.compare(results, harness.load_baseline())
+    print("\n".join(lines))
+
+if __name__ == "__main__":
+    main()
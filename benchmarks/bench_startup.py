@@ -0,0 +1,122 @@
+#bench_startup
+# Run from the repo root: python -m benchmarks.bench_startup --report
+
+import argparse
+import ast
+import glob
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+from benchmarks import harness
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Streamlit's own import cost is the same for every page and outside our control.
+EXCLUDED_MODULES = ('streamlit',)
+
+# Runs a page's module-level imports in a fresh interpreter and reports how long they took.
+CHILD_SCRIPT = '''import json, sys, time
+start = time.perf_counter()
+{imports}
+seconds = time.perf_counter() - start
+rss = None
+try:
+    # VmHWM is this process's own peak; ru_maxrss on Linux can carry over the parent's from before exec.
+    with open("/proc/self/status") as f:
+        rss = next(int(line.split()[1]) / 1024 for line in f if line.startswith("VmHWM:"))
+except (OSError, StopIteration):
+    try:
+        import resource
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024 if sys.platform == "darwin" else 1024)
+    except ImportError:
+        pass
+print(json.dumps({{"seconds": seconds, "rss_mb": rss}}))
+'''
+
+def page_paths():
+    return [os.path.join(REPO_ROOT, "app.py")] + sorted(glob.glob(os.path.join(REPO_ROOT, "pages", "*.py")))
+
+def page_imports(path):
+    # Only module-level imports: the ones a cold start of the page pays for before rendering anything.
+    with open(path, encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=path)
+    statements = []
+    for node in tree.body:
+        if isinstance(node, (ast.Import, ast.ImportFrom)):
+            modules = [alias.name for alias in node.names] if isinstance(node, ast.Import) else [node.module or ""]
+            if not any(module.split(".")[0] in EXCLUDED_MODULES for module in modules):
+                statements.append(ast.unparse(node))
+    return statements
+
+def page_name(path):
+    return os.path.splitext(os.path.basename(path))[0]
+
+def time_imports(statements):
+    output = subprocess.run(
+        [sys.executable, "-c", CHILD_SCRIPT.format(imports="\n".join(statements))],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def import_report(statements, top=15):
+    # Parses `python -X importtime` output into (package, self ms, cumulative ms) for the top-level packages.
+    stderr = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "\n".join(statements)],
+        cwd=REPO_ROOT, capture_output=True, text=True, check=True
+    ).stderr
+    packages = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        fields = line[len("import time:"):].split("|")
+        try:
+            self_us, cumulative_us = int(fields[0]), int(fields[1])
+        except ValueError:
+            continue
+        name = fields[2].strip()
+        package = name.split(".")[0]
+        entry = packages.setdefault(package, [0, 0])
+        entry[0] += self_us
+        if fields[2].startswith(" ") and not fields[2][1:].startswith(" "):
+            # Top-level import (one space of indentation): its cumulative time is the package's cost here.
+            entry[1] = max(entry[1], cumulative_us)
+    ranked = sorted(packages.items(), key=lambda item: item[1][0], reverse=True)[:top]
+    return [(package, self_us / 1000, cumulative_us / 1000) for package, (self_us, cumulative_us) in ranked]
+
+def run(repeat=5):
+    results = {}
+    for path in page_paths():
+        statements = page_imports(path)
+        samples = [time_imports(statements) for _ in range(repeat)]
+        seconds = sorted(sample["seconds"] for sample in samples)
+        rss = [sample["rss_mb"] for sample in samples if sample["rss_mb"] is not None]
+        results[f"startup/{page_name(path)}"] = {
+            "runs": repeat,
+            "p50_ms": round(harness.percentile(seconds, 0.50) * 1000, 4),
+            "p95_ms": round(harness.percentile(seconds, 0.95) * 1000, 4),
+            "mean_ms": round(statistics.mean(seconds) * 1000, 4),
+            "throughput_per_s": None,
+            "peak_mb": round(statistics.median(rss), 3) if rss else 0.0,
+        }
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the cold-start import time of each Streamlit page.")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--report", action="store_true", help="Also list the packages that dominate each page's import time.")
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+    results = run(args.repeat)
+    lines, _ = harness.compare(results, harness.load_baseline())
+    print("\n".join(lines))
+    if args.report:
+        for path in page_paths():
+            print(f"\n{page_name(path)}")
+            print(f"  {'package':<28} {'self ms':>9} {'cumulative ms':>14}")
+            for package, self_ms, cumulative_ms in import_report(page_imports(path), args.top):
+                print(f"  {package:<28} {self_ms:>9.1f} {cumulative_ms:>14.1f}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+#bench_validation
+# Run from the repo root: python -m benchmarks.bench_validation --params 100 500 2000
+
+import argparse
+import json
+import random
+
+from benchmarks import harness
+from utils import ai_processing
+from utils.gemini_client import FakeModel, GeminiClient
+
+def make_specs(num_params):
+    # Roughly the mix seen in spec sheets: mostly numeric limits, the rest free-text descriptions.
+    specs = []
+    for i in range(num_params):
+        kind = ('numeric_range', 'numeric_max', 'numeric_min', 'text', 'numeric_range')[i % 5]
+        if kind == 'numeric_range':
+            specs.append({"name": f"Param {i}", "spec": "98.0 - 102.0", "type": kind, "min": 98.0, "max": 102.0})
+        elif kind == 'numeric_max':
+            specs.append({"name": f"Param {i}", "spec": "NMT 0.5%", "type": kind, "max": 0.5})
+        elif kind == 'numeric_min':
+            specs.append({"name": f"Param {i}", "spec": "NLT 99.0%", "type": kind, "min": 99.0})
+        else:
+            specs.append({"name": f"Param {i}", "spec": "White to off-white crystalline powder", "type": kind})
+    return specs
+
+def make_inputs(specs, rng, run_id=0):
+    # Half the text observations are plain confirmations decided locally; the rest need the model.
+    inputs = {}
+    for i, spec in enumerate(specs):
+        if spec['type'] == 'numeric_range':
+            inputs[spec['name']] = str(round(rng.uniform(97.5, 102.5), 2))
+        elif spec['type'] == 'numeric_max':
+            inputs[spec['name']] = str(round(rng.uniform(0.1, 0.6), 2))
+        elif spec['type'] == 'numeric_min':
+            inputs[spec['name']] = str(round(rng.uniform(98.5, 100.0), 2))
+        else:
+            inputs[spec['name']] = "complies" if i % 2 else f"off-white powder, lot {run_id}"
+    return inputs
+
+def fake_validation_response(prompt):
+    # Answers the text validation prompt the way Gemini does: one Pass per input item.
+    items = json.loads(prompt.split("INPUT JSON:", 1)[1].split("When validating", 1)[0])
+    return json.dumps({"validation_results": [
+        {"id": item["id"], "name": item["name"], "decision": "Pass", "remark": "Matches the specification."} for item in items
+    ]})
+
+def install_fake_gemini(latency=0.0):
+    ai_processing.client = GeminiClient(FakeModel(fake_validation_response, latency), requests_per_minute=1e9)
+    return ai_processing.client
+
+def run(param_counts, repeat=20, gemini_latency=0.0):
+    results = {}
+    for num_params in param_counts:
+        with harness.scratch_dir():
+            model = install_fake_gemini(gemini_latency).model
+            rng = random.Random(0)
+            specs = make_specs(num_params)
+            prefix = f"validation/{num_params}"
+            state = {"inputs": make_inputs(specs, rng), "run": 0}
+
+            def fresh_observations():
+                # New text observations each run, so nothing is answered from the accepted-observation store.
+                state["run"] += 1
+                state["inputs"] = make_inputs(specs, rng, state["run"])
+
+            calls_before = model.calls
+            results[f"{prefix}/first_seen"] = harness.measure(
+                lambda: ai_processing.validate_qc_results(specs, state["inputs"], material="Benchmark Material"),
+                repeat, items=num_params, setup=fresh_observations
+            )
+            results[f"{prefix}/first_seen"]["gemini_calls_per_run"] = round((model.calls - calls_before) / (repeat + 2), 2)
+            # Re-validating the same observations: model-approved ones are now decided locally.
+            calls_before = model.calls
+            results[f"{prefix}/repeat"] = harness.measure(
+                lambda: ai_processing.validate_qc_results(specs, state["inputs"], material="Benchmark Material"),
+                repeat, items=num_params
+            )
+            results[f"{prefix}/repeat"]["gemini_calls_per_run"] = round((model.calls - calls_before) / (repeat + 2), 2)
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark validate_qc_results on large spec sets against a fake Gemini model.")
+    parser.add_argument("--params", type=int, nargs="+", default=[100, 500, 2000])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--gemini-latency", type=float, default=0.0, help="Seconds the fake model waits per call.")
+    args = parser.parse_args()
+    results = run(args.params, args.repeat, args.gemini_latency)
+    lines, _ = harness.compare(results, harness.load_baseline())
+    print("\n".join(lines))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,130 @@
+#benchmark harness
+
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from utils import db, llm_cache, sample_cache
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baseline.json')
+# A case is flagged when its p50 latency grows by more than this fraction over the baseline.
+REGRESSION_THRESHOLD = 0.25
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, int(round(fraction * (len(sorted_values) - 1)))))
+    return sorted_values[index]
+
+def measure(func, repeat=20, warmup=1, items=1, setup=None, quiet=True):
+    # Calls func() `repeat` times and returns latency percentiles (ms), throughput (items/s) and the
+    # peak Python allocation (MB) of one extra traced call. setup(), if given, runs untimed before each call.
+    sink = io.StringIO() if quiet else None
+    with contextlib.redirect_stdout(sink) if quiet else contextlib.nullcontext():
+        for _ in range(warmup):
+            if setup:
+                setup()
+            func()
+        latencies = []
+        for _ in range(repeat):
+            if setup:
+                setup()
+            start = time.perf_counter()
+            func()
+            latencies.append(time.perf_counter() - start)
+        if setup:
+            setup()
+        tracemalloc.start()
+        try:
+            func()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    latencies.sort()
+    total = sum(latencies)
+    return {
+        "runs": repeat,
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 4),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 4),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 4),
+        "throughput_per_s": round(items * repeat / total, 2) if total else None,
+        "peak_mb": round(peak / (1024 * 1024), 3),
+    }
+
+@contextlib.contextmanager
+def scratch_dir(prefix="qc-bench-"):
+    # The utils modules use paths relative to the working directory (data/, temp_mineru_*), so each
+    # benchmark runs in its own empty directory and never touches real data.
+    previous = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix=prefix) as path:
+        os.chdir(path)
+        try:
+            yield path
+        finally:
+            reset_connections()
+            os.chdir(previous)
+
+def reset_connections():
+    # Thread-local SQLite connections hold the path they were opened with.
+    for module in (db, llm_cache):
+        conn = getattr(module._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+        module._local.__dict__.clear()
+    sample_cache.state.update(seq=None, checked_at=0.0)
+    sample_cache.state["queries"].clear()
+    sample_cache.state["samples"].clear()
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": os.cpu_count(),
+    }
+
+def load_baseline(path=BASELINE_FILE):
+    try:
+        with open(path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_baseline(results, path=BASELINE_FILE):
+    # Sorted and indented so a re-recorded baseline reads as a normal diff in review.
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({"environment": environment(), "results": results}, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+def compare(results, baseline, threshold=REGRESSION_THRESHOLD):
+    # Returns (report lines, names of regressed cases).
+    lines, regressions = [], []
+    previous = baseline.get("results", {})
+    width = max([len(name) for name in results] + [10])
+    lines.append(f"{'case':<{width}}  {'p50 ms':>10}  {'p95 ms':>10}  {'per s':>12}  {'peak MB':>8}  {'vs baseline':>12}")
+    for name, result in results.items():
+        change = ""
+        old = previous.get(name)
+        if old and old.get("p50_ms"):
+            ratio = result["p50_ms"] / old["p50_ms"] - 1
+            change = f"{ratio:+.0%}"
+            if ratio > threshold:
+                change += " SLOWER"
+                regressions.append(name)
+        lines.append(
+            f"{name:<{width}}  {result['p50_ms']:>10.3f}  {result['p95_ms']:>10.3f}  "
+            f"{result['throughput_per_s'] or 0:>12,.1f}  {result['peak_mb']:>8.2f}  {change:>12}"
+        )
+    if previous and baseline.get("environment") != environment():
+        lines.append("Note: the baseline was recorded on a different machine or Python; compare with care.")
+    return lines, regressions
+
+def log(message):
+    print(message, file=sys.stderr, flush=True)
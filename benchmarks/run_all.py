@@ -0,0 +1,40 @@
+#run_all
+# Run from the repo root: python -m benchmarks.run_all [--quick] [--save-baseline]
+
+import argparse
+import json
+import sys
+
+from benchmarks import bench_db, bench_mineru_cache, bench_startup, bench_validation, harness
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the storage, validation, document cache and page startup benchmarks and compare them with the stored baseline.")
+    parser.add_argument("--quick", action="store_true", help="Smaller data sets and fewer runs, for a fast check.")
+    parser.add_argument("--save-baseline", action="store_true", help=f"Overwrite {harness.BASELINE_FILE} with these results.")
+    parser.add_argument("--fail-on-regression", action="store_true", help="Exit with status 1 if any case is slower than the baseline threshold.")
+    parser.add_argument("--json", help="Also write the raw results to this file.")
+    args = parser.parse_args()
+
+    repeat = 5 if args.quick else 20
+    results = {}
+    results.update(bench_db.run([1000, 100000] if args.quick else [1000, 100000, 1000000], repeat))
+    results.update(bench_validation.run([100, 500] if args.quick else [100, 500, 2000], repeat))
+    results.update(bench_mineru_cache.run(repeat))
+    results.update(bench_startup.run(3 if args.quick else 10))
+
+    baseline = harness.load_baseline()
+    lines, regressions = harness.compare(results, baseline)
+    print("\n".join(lines))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump({"environment": harness.environment(), "results": results}, f, indent=2, sort_keys=True)
+    if args.save_baseline:
+        harness.save_baseline(results)
+        print(f"Baseline saved to {harness.BASELINE_FILE}.")
+    elif regressions:
+        print(f"{len(regressions)} case(s) slower than the baseline by more than {harness.REGRESSION_THRESHOLD:.0%}.")
+        if args.fail_on_regression:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,12 @@
 #production dashboard
 
 import streamlit as st
-from utils.doc_parser import get_md_from_file_mineru
-from utils import ai_processing, db
+from utils import ai_processing, db, doc_parser, jobs, metrics, spec_tables
+from utils.bulk_ingest import ingest_files
 import datetime
+import json
 import random
-import pandas as pd
+import threading
 
 st.set_page_config(page_title="Production Dashboard", layout="wide")
 
@@ -15,39 +16,121 @@ if st.session_state.get('role') != 'Production':
 
 if 'specs_data' not in st.session_state: st.session_state.specs_data = None
 if 'validation_results' not in st.session_state: st.session_state.validation_results = None
+if 'doc_summary' not in st.session_state: st.session_state.doc_summary = None
+if 'process_job_id' not in st.session_state: st.session_state.process_job_id = None
+if 'validation_job' not in st.session_state: st.session_state.validation_job = None
+
+# Heavy work runs in background worker processes so it survives reruns and doesn't compete with rendering.
+jobs.ensure_workers()
+metrics.start_server()
+# Jobs are polled by a fragment, which reruns only itself, so a short interval is cheap.
+JOB_POLL_SECONDS = 0.25
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def poll_job(job_id, message, stuck_message):
+    # Waits for a job without rerunning the page; the full rerun that shows the result starts once it has finished.
+    job = jobs.get_job(job_id)
+    if job is None or job['status'] in (jobs.DONE, jobs.FAILED):
+        st.rerun(scope="app")
+    if jobs.stuck_in_queue(job):
+        st.error(stuck_message)
+    st.info(message.format(status=job['status']))
 
 st.title("Production Department Dashboard")
 
+upload_mode = st.radio("Upload Mode", ["Single Document", "Bulk Ingestion"], horizontal=True)
+
+if upload_mode == "Bulk Ingestion":
+    st.header("Bulk Document Ingestion")
+    bulk_files = st.file_uploader("Upload Specification Sheets", type=['pdf', 'docx', 'doc'], accept_multiple_files=True)
+    bulk_job = st.session_state.get('bulk_job')
+    # Per-document and per-session size limits. Streamlit has already buffered these files, so this
+    # bounds what a session can submit for processing; maxUploadSize in .streamlit/config.toml bounds the buffering.
+    upload_error = doc_parser.check_upload_sizes(bulk_files) if bulk_files else None
+
+    if upload_error:
+        st.error(upload_error)
+    elif bulk_files and (bulk_job is None or not bulk_job["thread"].is_alive()):
+        if st.button("Start Bulk Processing"):
+            # Keyed by position, like ingest_files' results: two uploads can share a name.
+            progress = {i: {"index": i, "file": f.name, "status": "queued"} for i, f in enumerate(bulk_files)}
+            # Runs off the script thread; the callback only touches this dict, never Streamlit APIs.
+            thread = threading.Thread(
+                target=ingest_files,
+                args=(list(bulk_files),),
+                kwargs={"progress_callback": lambda entry: progress.__setitem__(entry["index"], entry)},
+                daemon=True
+            )
+            thread.start()
+            st.session_state.bulk_job = {"thread": thread, "progress": progress}
+            st.rerun()
+
+    if bulk_job:
+        entries = list(bulk_job["progress"].values())
+        finished = sum(1 for e in entries if e["status"] in ("done", "needs review", "failed"))
+        st.progress(finished / max(1, len(entries)), text=f"{finished} of {len(entries)} documents processed")
+        # pandas is imported where a table is first rendered so it doesn't slow the page's cold start.
+        import pandas as pd
+        df_bulk = pd.DataFrame([{k: e.get(k) for k in ("file", "status", "material", "parameters", "error")} for e in entries])
+        st.dataframe(df_bulk, use_container_width=True)
+        if bulk_job["thread"].is_alive():
+            if st.button("Refresh Progress"):
+                st.rerun()
+        else:
+            extracted = [e for e in entries if e.get("specs")]
+            if extracted:
+                st.download_button("Download Extracted Specifications", data=json.dumps(extracted, indent=2), file_name="bulk_specs.json", mime="application/json")
+    st.stop()
+
 #Step 1: File Upload and Processing
 st.header("Step 1: Upload and Process Document")
 uploaded_file = st.file_uploader("Upload a Specification Sheet", type=['pdf', 'docx', 'doc'])
 
-if uploaded_file:
+upload_error = doc_parser.check_upload_sizes([uploaded_file]) if uploaded_file else None
+
+if upload_error:
+    st.error(upload_error)
+elif uploaded_file:
     if st.button("Process Document"):
         st.session_state.specs_data = None
         st.session_state.validation_results = None
-        
-        with st.spinner("Processing document... (This may be instant if cached)"):
-            markdown_content = get_md_from_file_mineru(uploaded_file)
-            if "Error" in markdown_content:
-                st.error(markdown_content)
-            else:
-                success, result = ai_processing.extract_specs_from_text(markdown_content)
-                if success:
-                    st.session_state.specs_data = result
-                    st.success("Document processed! Please proceed to Step 2.")
-                    st.rerun()
-                else:
-                    st.error("AI Extraction Failed. See details below:")
-                    st.code(result, language='text')
+        st.session_state.doc_summary = None
+        st.session_state.validation_job = None
+        # A document seen before is answered from the Mineru and LLM caches here, without queueing a job.
+        cached = jobs.process_document_from_cache(uploaded_file)
+        if cached:
+            st.session_state.specs_data = cached['specs']
+            st.session_state.doc_summary = cached['summary']
+        else:
+            st.session_state.process_job_id = jobs.submit_document(uploaded_file)
+        st.rerun()
+
+if st.session_state.process_job_id:
+    job = jobs.get_job(st.session_state.process_job_id)
+    if job is None or job['status'] == jobs.FAILED:
+        st.session_state.process_job_id = None
+        st.error("Document Processing Failed. See details below:")
+        st.code(job['error'] if job else "The processing job could not be found.", language='text')
+    elif job['status'] == jobs.DONE:
+        st.session_state.process_job_id = None
+        st.session_state.specs_data = job['result']['specs']
+        # Computed once by the job (and cached by document hash) instead of on every form rerun.
+        st.session_state.doc_summary = job['result']['summary']
+        st.success("Document processed! Please proceed to Step 2.")
+        st.rerun()
+    else:
+        poll_job(job['job_id'], "Processing document in the background ({status})...",
+                 "No background worker is running to process this document. Check the server log, or start workers with: python -m utils.jobs")
 
 #Step 2: User Input Form
 if st.session_state.specs_data and st.session_state.validation_results is None:
     st.header("Step 2: Review and Pre-Validate Observations")
     
-    summary = ai_processing.summarize_document_context(get_md_from_file_mineru(uploaded_file))
+    summary = st.session_state.doc_summary
     if summary:
         st.info(f"**AI Document Summary:** {summary}")
+    for warning in st.session_state.specs_data.get('warnings', []):
+        st.warning(f"**Extraction incomplete:** {warning} Check the parameters below against the document.")
 
     with st.form("pre_validation_form"):
         
@@ -57,26 +140,69 @@ if st.session_state.specs_data and st.session_state.validation_results is None:
         performed_by = st.text_input("Performed By (Your Name)")
         
         st.subheader("Enter Your Observations")
+        parameters = st.session_state.specs_data.get('parameters', [])
+        unclassified = [param.get('name') for param in parameters if param.get('type') is None]
+        if unclassified:
+            st.warning("Enter the limit of each unclassified parameter (e.g. 'NMT 0.1', '98 - 102', 'NLT 5'), or 'text' for a descriptive check.")
         user_inputs = {}
-        for i, param in enumerate(st.session_state.specs_data.get('parameters', [])):
+        manual_limits = {}
+        for i, param in enumerate(parameters):
             param_name = param.get('name')
-            if param.get('type') == 'text':
+            if param.get('type') is None:
+                limit_col, value_col = st.columns(2)
+                manual_limits[i] = limit_col.text_input(label=f"Limit for '{param_name}' (Spec: {param.get('spec')})", key=f"limit_{i}")
+                user_inputs[param_name] = value_col.text_input(label=f"Value or observation for '{param_name}'", key=f"manual_{i}")
+            elif param.get('type') == 'text':
                 user_inputs[param_name] = st.text_input(label=f"Observation for '{param_name}' (Spec: {param.get('spec')})", key=f"text_{i}")
             else:
                 user_inputs[param_name] = st.number_input(label=f"Value for '{param_name}' (Spec: {param.get('spec')})", value=None, format="%.4f", key=f"num_{i}")
         
         validate_button = st.form_submit_button("Validate My Observations")
         if validate_button:
+            resolved = [spec_tables.classify_manually(param, manual_limits[i]) if i in manual_limits else param for i, param in enumerate(parameters)]
+            unreadable = [param.get('name') for param, resolved_param in zip(parameters, resolved) if resolved_param is None]
             if not material_name or not performed_by:
                 st.warning("Please fill in both 'Material Name' and 'Performed By' fields.")
+            elif unreadable:
+                st.warning(f"Please enter a recognisable limit (or 'text') for: {', '.join(unreadable)}.")
             else:
-                with st.spinner("AI is performing validation..."):
-                    final_decision, results_breakdown = ai_processing.validate_qc_results(st.session_state.specs_data.get('parameters'), user_inputs)
+                # The manual classifications become part of the specs that are validated and submitted.
+                st.session_state.specs_data['parameters'] = resolved
+                if not ai_processing.needs_model_validation(resolved, user_inputs, material_name):
+                    # Numeric limits and text decided by the local rules: validated here, no job needed.
+                    final_decision, results_breakdown = ai_processing.validate_qc_results(resolved, user_inputs, material=material_name)
                     st.session_state.validation_results = {
                         "decision": final_decision, "breakdown": results_breakdown, "inputs": user_inputs,
                         "material_name": material_name, "performed_by": performed_by
                     }
-                    st.rerun()
+                else:
+                    job_id = jobs.submit_job("validate", {
+                        "specifications": resolved,
+                        "qc_results": user_inputs, "material": material_name
+                    })
+                    st.session_state.validation_job = {
+                        "job_id": job_id, "inputs": user_inputs,
+                        "material_name": material_name, "performed_by": performed_by
+                    }
+                st.rerun()
+
+    if st.session_state.validation_job:
+        pending = st.session_state.validation_job
+        job = jobs.get_job(pending['job_id'])
+        if job is None or job['status'] == jobs.FAILED:
+            st.session_state.validation_job = None
+            st.error("Validation Failed. See details below:")
+            st.code(job['error'] if job else "The validation job could not be found.", language='text')
+        elif job['status'] == jobs.DONE:
+            st.session_state.validation_job = None
+            st.session_state.validation_results = {
+                "decision": job['result']['decision'], "breakdown": job['result']['breakdown'], "inputs": pending['inputs'],
+                "material_name": pending['material_name'], "performed_by": pending['performed_by']
+            }
+            st.rerun()
+        else:
+            poll_job(job['job_id'], "AI is performing validation ({status})...",
+                     "No background worker is running to validate these observations. Check the server log, or start workers with: python -m utils.jobs")
 
 if st.session_state.validation_results:
     st.header("Step 3: Pre-Validation Results")
@@ -86,6 +212,7 @@ if st.session_state.validation_results:
     st.metric("Pre-Validation Decision", results['decision'])
     st.info(f"Analysis for **{results['material_name']} (Stage: {ai_extracted_stage})** performed by: **{results['performed_by']}**")
 
+    import pandas as pd
     df_results = pd.DataFrame(results['breakdown'])
     if 'QC Result' in df_results.columns:
         df_results['QC Result'] = df_results['QC Result'].astype(str)
@@ -97,9 +224,9 @@ if st.session_state.validation_results:
         if st.button("Confirm and Submit to QC"):
             with st.spinner("Submitting to QC..."):
                 now = datetime.datetime.now()
-                sample_id = f"SMP-{now.strftime('%Y%m%d')}-{random.randint(1000, 9999)}"
+                make_sample_id = lambda: f"SMP-{now.strftime('%Y%m%d')}-{random.randint(1000, 9999)}"
                 sample_data = {
-                    "sample_id": sample_id,
+                    "sample_id": make_sample_id(),
                     "material_info": { 
                         "name": results['material_name'], 
                         "stage": st.session_state.specs_data.get('stage') 
@@ -110,10 +237,12 @@ if st.session_state.validation_results:
                     "status": "Sample Ready for Analysis", "request_date": now.isoformat(),
                     "qc_inputs": {}, "analysis_results": None, "final_decision": None, 
                 }
-                db.save_sample(sample_data)
-                st.success(f"Sample submitted to QC.")
+                # A same-day ID that is already taken is replaced with a fresh one.
+                sample_id = db.save_sample(sample_data, make_id=make_sample_id)
+                st.success(f"Sample {sample_id} submitted to QC.")
                 st.session_state.specs_data = None
                 st.session_state.validation_results = None
+                st.session_state.doc_summary = None
                 
     else:
         st.error("One or more parameters failed.")
@@ -1,36 +1,86 @@
-#qc dashboard
-
-import streamlit as st
-from utils import db, ai_processing
-import pandas as pd
-
-st.set_page_config(page_title="QC Dashboard", layout="wide")
-
-if st.session_state.get('role') != 'QC':
-    st.warning("Please select the 'QC' role from the main page sidebar.")
-    st.stop()
-
-st.title("Quality Control (QC) Dashboard")
-
-if st.button("Refresh Pending Samples"):
-    st.rerun()
-
-all_samples = db.get_samples()
-pending_samples = [s for s in all_samples if s and s.get('status') == "Sample Ready for Analysis"]
-
-st.header("Pending Samples for Analysis")
-
-if not pending_samples:
-    st.info("There are no samples currently pending analysis. If a sample was just submitted, click 'Refresh'.")
-else:
-    for sample in pending_samples:
-        with st.expander(f"**Sample ID:** {sample['sample_id']} | **Material:** {sample.get('material_info', {}).get('name', 'N/A')}"):
-            
-            st.subheader("Sample Details")
-            col1, col2, col3 = st.columns(3)
-            material_info = sample.get('material_info', {})
-            col1.metric("Material Name", material_info.get('name', 'N/A'))
-            col2.metric("Production Stage", material_info.get('stage', 'N/A'))
-            col3.metric("Submitted By (Production)", sample.get('performed_by', 'N/A'))
-            
+#qc dashboard
+
+import streamlit as st
+from utils import metrics, sample_cache
+
+st.set_page_config(page_title="QC Dashboard", layout="wide")
+
+metrics.start_server()
+
+if st.session_state.get('role') != 'QC':
+    st.warning("Please select the 'QC' role from the main page sidebar.")
+    st.stop()
+
+st.title("Quality Control (QC) Dashboard")
+
+PENDING_STATUS = "Sample Ready for Analysis"
+PAGE_SIZE = 20
+
+if 'qc_page_cursors' not in st.session_state: st.session_state.qc_page_cursors = [None]
+
+# Version of the sample store this render is based on; the watcher below reruns the page when it moves.
+st.session_state.qc_seen_seq = sample_cache.current_seq()
+
+def reset_paging():
+    st.session_state.qc_page_cursors = [None]
+
+def watch_for_changes():
+    # Reads the shared version counter (no query per session), so an idle dashboard costs next to nothing.
+    if sample_cache.current_seq() != st.session_state.qc_seen_seq:
+        st.rerun()
+
+if hasattr(st, "fragment"):
+    st.fragment(run_every=sample_cache.CHANGE_POLL_SECONDS)(watch_for_changes)()
+elif st.button("Refresh Pending Samples"):
+    # Streamlit versions without fragments can't update on their own.
+    reset_paging()
+    st.rerun()
+
+st.header("Pending Samples for Analysis")
+
+filter_col1, filter_col2, filter_col3 = st.columns(3)
+material_filter = filter_col1.selectbox("Material", ["All"] + sample_cache.get_material_names(PENDING_STATUS), on_change=reset_paging)
+date_range = filter_col2.date_input("Submitted between", value=(), on_change=reset_paging)
+sort_order = filter_col3.selectbox("Sort", ["Oldest first", "Newest first"], on_change=reset_paging)
+
+date_from = date_range[0] if len(date_range) > 0 else None
+date_to = date_range[1] if len(date_range) > 1 else None
+filters = {
+    "status": PENDING_STATUS,
+    "material": None if material_filter == "All" else material_filter,
+    "date_from": date_from,
+    "date_to": date_to,
+}
+
+page_index = len(st.session_state.qc_page_cursors) - 1
+pending_samples, next_cursor = sample_cache.query_samples(
+    **filters,
+    newest_first=sort_order == "Newest first",
+    cursor=st.session_state.qc_page_cursors[-1],
+    limit=PAGE_SIZE
+)
+
+if not pending_samples:
+    st.info("There are no samples currently pending analysis. If a sample was just submitted, click 'Refresh'.")
+else:
+    total_pending = sample_cache.count_samples(**filters)
+    st.caption(f"Page {page_index + 1} of {max(1, -(-total_pending // PAGE_SIZE))} ({total_pending} pending)")
+    nav_col1, nav_col2 = st.columns(2)
+    if nav_col1.button("Previous Page", disabled=page_index == 0):
+        st.session_state.qc_page_cursors.pop()
+        st.rerun()
+    if nav_col2.button("Next Page", disabled=next_cursor is None):
+        st.session_state.qc_page_cursors.append(next_cursor)
+        st.rerun()
+
+    for sample in pending_samples:
+        with st.expander(f"**Sample ID:** {sample['sample_id']} | **Material:** {sample.get('material_info', {}).get('name', 'N/A')}"):
+            
+            st.subheader("Sample Details")
+            col1, col2, col3 = st.columns(3)
+            material_info = sample.get('material_info', {})
+            col1.metric("Material Name", material_info.get('name', 'N/A'))
+            col2.metric("Production Stage", material_info.get('stage', 'N/A'))
+            col3.metric("Submitted By (Production)", sample.get('performed_by', 'N/A'))
+            
             st.subheader("Specifications and Production Observations")
\ No newline at end of file
@@ -0,0 +1,77 @@
+#performance dashboard
+
+import streamlit as st
+from utils import metrics
+import time
+import pandas as pd
+
+st.set_page_config(page_title="Performance", layout="wide")
+
+metrics.start_server()
+
+st.title("Performance")
+st.caption(f"Prometheus endpoint: http://{metrics.METRICS_HOST}:{metrics.METRICS_PORT}/metrics · Trace file: {metrics.TRACE_FILE}")
+
+WINDOWS = {"Last hour": 3600, "Last 24 hours": 24 * 3600, "Last 7 days": 7 * 24 * 3600, "All": None}
+
+window_col, refresh_col = st.columns([3, 1])
+window = window_col.selectbox("Time window", list(WINDOWS))
+if refresh_col.button("Refresh"):
+    st.rerun()
+
+seconds = WINDOWS[window]
+events = metrics.read_events(since=time.time() - seconds if seconds else None)
+spans = pd.DataFrame([e for e in events if e.get("type") == "span"])
+counts = pd.DataFrame([e for e in events if e.get("type") == "count"])
+
+if spans.empty and counts.empty:
+    st.info("No trace events recorded in this window yet.")
+    st.stop()
+
+st.header("Latency per Stage")
+if spans.empty:
+    st.info("No timed stages in this window.")
+else:
+    grouped = spans.groupby("stage")["duration"]
+    latency = pd.DataFrame({
+        "Calls": grouped.size(),
+        "Failures": (~spans["ok"].astype(bool)).groupby(spans["stage"]).sum(),
+        "p50 (ms)": grouped.quantile(0.5) * 1000,
+        "p95 (ms)": grouped.quantile(0.95) * 1000,
+        "Max (ms)": grouped.max() * 1000,
+        "Total (s)": grouped.sum(),
+    }).sort_values("Total (s)", ascending=False)
+    st.dataframe(latency.round({"p50 (ms)": 1, "p95 (ms)": 1, "Max (ms)": 1, "Total (s)": 3}), use_container_width=True)
+
+    gemini = spans[spans["stage"] == "gemini.call"]
+    if not gemini.empty:
+        st.subheader("Gemini Calls")
+        token_cols = [col for col in ("prompt_tokens", "response_tokens") if col in gemini.columns]
+        gemini_cols = st.columns(3)
+        gemini_cols[0].metric("Calls", len(gemini))
+        for col, name in zip(gemini_cols[1:], token_cols):
+            col.metric(name.replace("_", " ").capitalize(), f"{int(gemini[name].fillna(0).sum()):,}")
+        if "attempts" in gemini.columns:
+            st.caption(f"{int((gemini['attempts'].fillna(1) > 1).sum())} call(s) needed a retry.")
+
+    st.subheader("Slowest Recent Spans")
+    slowest = spans.nlargest(20, "duration").copy()
+    slowest["time"] = pd.to_datetime(slowest["ts"], unit="s")
+    slowest["duration (ms)"] = (slowest["duration"] * 1000).round(1)
+    st.dataframe(slowest[["time", "stage", "duration (ms)", "ok", "pid"]], use_container_width=True, hide_index=True)
+
+st.header("Cache Hit Rates")
+cache_counts = counts[counts["name"] == "cache_requests"] if not counts.empty else counts
+if cache_counts.empty:
+    st.info("No cache lookups in this window.")
+else:
+    cache_name = cache_counts["labels"].map(lambda labels: ":".join(filter(None, (labels.get("cache"), labels.get("namespace"))))).rename("Cache")
+    results = cache_counts["labels"].map(lambda labels: labels.get("result"))
+    hits = cache_counts["value"].where(results == "hit", 0).groupby(cache_name).sum()
+    totals = cache_counts["value"].groupby(cache_name).sum()
+    st.dataframe(pd.DataFrame({"Lookups": totals, "Hits": hits, "Hit rate": (hits / totals).round(3)}), use_container_width=True)
+
+decision_counts = counts[counts["name"] == "text_decisions"] if not counts.empty else counts
+if not decision_counts.empty:
+    sources = decision_counts["value"].groupby(decision_counts["labels"].map(lambda labels: labels.get("source"))).sum()
+    st.caption(f"Text parameters decided locally: {sources.get('local', 0)} · by the model: {sources.get('llm', 0)}")
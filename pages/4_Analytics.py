@@ -0,0 +1,83 @@
+#analytics dashboard
+
+import streamlit as st
+from utils import analytics_export, metrics, sample_cache
+
+st.set_page_config(page_title="Analytics", layout="wide")
+
+metrics.start_server()
+
+st.title("QC Analytics")
+
+try:
+    # Brings the Parquet dataset up to date with the sample store; only changed months are rewritten.
+    if analytics_export.exported_seq() != sample_cache.current_seq():
+        with st.spinner("Updating the analytics dataset..."):
+            analytics_export.export_samples()
+except ImportError as e:
+    st.error(str(e))
+    st.stop()
+
+months = analytics_export.list_months()
+if not months:
+    st.info("No samples have been submitted yet.")
+    st.stop()
+
+filter_col1, filter_col2, filter_col3 = st.columns(3)
+month_from = filter_col1.selectbox("From month", months, index=max(0, len(months) - 12))
+month_to = filter_col2.selectbox("To month", months, index=len(months) - 1)
+materials = filter_col3.multiselect("Materials", sample_cache.get_material_names(), placeholder="All materials")
+
+if month_from > month_to:
+    st.warning("'From month' is after 'To month'.")
+    st.stop()
+
+filters = {"month_from": month_from, "month_to": month_to, "materials": materials or None}
+
+st.header("Sample Failure Rate per Month")
+decisions = analytics_export.query_results(columns=["month", "sample_id", "final_decision"], **filters)
+decisions = decisions.dropna(subset=["final_decision"]).drop_duplicates("sample_id")
+if decisions.empty:
+    st.info("No samples with a final decision in this range.")
+else:
+    monthly = decisions.groupby("month")["final_decision"].agg(
+        Samples="size", Failed=lambda values: values.str.startswith("Fail").sum()
+    )
+    monthly["Failure rate (%)"] = (monthly["Failed"] / monthly["Samples"] * 100).round(1)
+    st.line_chart(monthly["Failure rate (%)"])
+    st.dataframe(monthly, use_container_width=True)
+
+st.header("Failure Rate per Parameter")
+results = analytics_export.query_results(columns=["parameter", "qc_decision", "within_spec"], **filters)
+# QC's decision where there is one, otherwise whether the numeric result fell inside the spec limits.
+failed = results["qc_decision"].eq("Fail").where(results["qc_decision"].notna(), results["within_spec"].eq(False))
+results = results.assign(failed=failed)[results["qc_decision"].notna() | results["within_spec"].notna()]
+if results.empty:
+    st.info("No evaluated parameters in this range.")
+else:
+    by_parameter = results.groupby("parameter")["failed"].agg(Results="size", Failed="sum")
+    by_parameter["Failure rate (%)"] = (by_parameter["Failed"] / by_parameter["Results"] * 100).round(1)
+    st.dataframe(by_parameter.sort_values("Failure rate (%)", ascending=False), use_container_width=True)
+
+st.header("Result Drift Against Spec Limits")
+parameter = st.selectbox("Parameter", sorted(results["parameter"].dropna().unique()) if not results.empty else [])
+if parameter:
+    drift = analytics_export.query_results(
+        columns=["request_date", "qc_numeric", "production_numeric", "spec_min", "spec_max"], parameters=[parameter], **filters
+    )
+    drift["Result"] = drift["qc_numeric"].fillna(drift["production_numeric"])
+    drift = drift.dropna(subset=["Result", "request_date"])
+    if drift.empty:
+        st.info("No numeric results for this parameter in this range.")
+    else:
+        daily = drift.groupby(drift["request_date"].dt.date).agg(
+            Mean=("Result", "mean"), Min=("Result", "min"), Max=("Result", "max"),
+            **{"Spec min": ("spec_min", "min"), "Spec max": ("spec_max", "max")}
+        )
+        st.line_chart(daily.dropna(axis=1, how="all"))
+        st.caption(f"{len(drift)} result(s); daily mean, min and max against the specification limits.")
+
+if st.button("Rebuild Analytics Dataset"):
+    with st.spinner("Rebuilding every month..."):
+        summary = analytics_export.export_samples(full=True)
+    st.success(f"Rebuilt {summary['rows']} rows across {len(summary['months'])} month(s).")
@@ -0,0 +1,22 @@
+#test fixtures
+
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import db, jobs, llm_cache, text_rules  # noqa: E402
+
+@pytest.fixture(autouse=True)
+def data_dir(tmp_path, monkeypatch):
+    # The stores and the metrics trace live under ./data; each test gets its own directory and fresh per-thread connections.
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(db, "_local", threading.local())
+    monkeypatch.setattr(db, "migration_error", None)
+    monkeypatch.setattr(llm_cache, "_local", threading.local())
+    monkeypatch.setattr(jobs, "_local", threading.local())
+    monkeypatch.setattr(text_rules, "_local", threading.local())
+    return tmp_path
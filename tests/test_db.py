@@ -0,0 +1,82 @@
+#db tests
+
+import datetime
+import json
+import os
+import sqlite3
+import threading
+
+import pytest
+
+from utils import db
+
+def save(sample_id, request_date, status="Pending QC", material="Citrate"):
+    db.save_sample({"sample_id": sample_id, "request_date": request_date, "status": status, "material_info": {"name": material}})
+
+def read_all(page_size, **filters):
+    ids, cursor, pages = [], None, 0
+    while True:
+        samples, cursor = db.query_samples(cursor=cursor, limit=page_size, **filters)
+        ids.extend(sample["sample_id"] for sample in samples)
+        pages += 1
+        if cursor is None:
+            return ids, pages
+
+def test_query_samples_pages_through_every_sample_once():
+    # S2 and S3 share a request_date: the rowid tie-break keeps them on separate pages without repeats.
+    for sample_id, request_date in [("S1", "2026-01-01T09:00:00"), ("S2", "2026-01-02T09:00:00"),
+                                    ("S3", "2026-01-02T09:00:00"), ("S4", "2026-01-03T09:00:00"), ("S5", "2026-02-01T09:00:00")]:
+        save(sample_id, request_date)
+    assert read_all(2) == (["S1", "S2", "S3", "S4", "S5"], 3)
+    assert read_all(2, newest_first=True) == (["S5", "S4", "S3", "S2", "S1"], 3)
+    assert read_all(5) == (["S1", "S2", "S3", "S4", "S5"], 1)
+
+def test_query_samples_filters_apply_to_every_page():
+    for i in range(7):
+        save(f"S{i}", f"2026-01-0{i + 1}T09:00:00", status="Pending QC" if i % 2 else "Done",
+             material="Citrate" if i < 5 else "Lactose")
+    assert read_all(1, status="Pending QC")[0] == ["S1", "S3", "S5"]
+    assert read_all(2, material="Citrate", date_from=datetime.date(2026, 1, 2), date_to=datetime.date(2026, 1, 4))[0] == ["S1", "S2", "S3"]
+    assert read_all(2, status="Rejected") == ([], 1)
+
+def reconnect(monkeypatch):
+    # A new connection, as in a new thread or process, runs the migration check again.
+    monkeypatch.setattr(db, "_local", threading.local())
+
+def write_legacy_file(text):
+    os.makedirs(db.DATA_DIR, exist_ok=True)
+    with open(db.SAMPLES_FILE, 'w', encoding='utf-8') as f:
+        f.write(text)
+
+def test_legacy_samples_are_migrated_once():
+    write_legacy_file(json.dumps([{"sample_id": "S1", "request_date": "2026-01-01T09:00:00"}, {}]))
+    assert [sample["sample_id"] for sample in db.get_samples()] == ["S1"]
+    assert not os.path.exists(db.SAMPLES_FILE) and os.path.exists(db.SAMPLES_FILE + '.migrated')
+    assert db.migration_error is None
+
+def test_an_unreadable_legacy_file_is_not_marked_migrated(monkeypatch):
+    legacy = json.dumps([{"sample_id": "S1", "request_date": "2026-01-01T09:00:00"}])
+    write_legacy_file(legacy[:20])
+    assert db.get_samples() == []
+    assert "could not be read" in db.migration_error
+    assert db.get_connection().execute("PRAGMA user_version").fetchone()[0] == 0
+    assert os.path.exists(db.SAMPLES_FILE)
+
+    write_legacy_file(legacy)
+    reconnect(monkeypatch)
+    assert [sample["sample_id"] for sample in db.get_samples()] == ["S1"]
+    assert db.migration_error is None
+
+def test_save_sample_retries_a_taken_id_with_a_fresh_one():
+    save("SMP-20260101-1234", "2026-01-01T09:00:00")
+    fresh_ids = iter(["SMP-20260101-1234", "SMP-20260101-5678"])
+    sample = {"sample_id": "SMP-20260101-1234", "request_date": "2026-01-01T10:00:00", "status": "Pending QC"}
+    assert db.save_sample(sample, make_id=lambda: next(fresh_ids)) == "SMP-20260101-5678"
+    assert db.get_sample("SMP-20260101-5678")["request_date"] == "2026-01-01T10:00:00"
+    assert db.get_sample("SMP-20260101-1234")["request_date"] == "2026-01-01T09:00:00"
+
+def test_save_sample_without_make_id_still_rejects_a_taken_id():
+    save("S1", "2026-01-01T09:00:00")
+    with pytest.raises(sqlite3.IntegrityError):
+        db.save_sample({"sample_id": "S1", "request_date": "2026-01-02T09:00:00"})
+    assert db.count_samples() == 1
@@ -0,0 +1,48 @@
+#doc_parser tests
+
+import json
+import os
+import subprocess
+import sys
+
+from utils import doc_parser
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+RECORD_ENTRIES = """
+import os, sys
+from utils import doc_parser
+doc_parser.get_mineru_version = lambda: "test"
+for i in range(int(sys.argv[2])):
+    file_hash = f"{sys.argv[1]}_{i}"
+    os.makedirs(os.path.dirname(doc_parser.get_cache_md_path(file_hash)), exist_ok=True)
+    with open(doc_parser.get_cache_md_path(file_hash), "w") as f:
+        f.write("# Spec")
+    doc_parser.record_cached_md(file_hash, file_hash)
+    doc_parser.lookup_cached_md_path(file_hash)
+"""
+
+def cache_entry(monkeypatch, file_hash, size=10):
+    monkeypatch.setattr(doc_parser, "get_mineru_version", lambda: "test")
+    md_path = doc_parser.get_cache_md_path(file_hash)
+    os.makedirs(os.path.dirname(md_path), exist_ok=True)
+    with open(md_path, "w", encoding="utf-8") as f:
+        f.write("x" * size)
+    doc_parser.record_cached_md(file_hash, f"{file_hash}.pdf")
+
+def test_processes_updating_the_cache_index_at_once_keep_every_entry():
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    processes = [subprocess.Popen([sys.executable, "-c", RECORD_ENTRIES, f"p{n}", "30"], env=env, stdout=subprocess.DEVNULL)
+                 for n in range(4)]
+    assert all(process.wait(timeout=120) == 0 for process in processes)
+    with open(doc_parser.CACHE_INDEX_FILE, encoding="utf-8") as f:
+        assert len(json.load(f)) == 4 * 30
+
+def test_least_recently_used_entries_are_evicted_past_the_budget(monkeypatch):
+    monkeypatch.setattr(doc_parser, "CACHE_MAX_BYTES", 25)
+    cache_entry(monkeypatch, "first")
+    cache_entry(monkeypatch, "second")
+    assert doc_parser.lookup_cached_md_path("first") is not None
+    cache_entry(monkeypatch, "third")
+    assert sorted(doc_parser.load_cache_index()) == ["first", "third"]
+    assert not os.path.exists(os.path.join(doc_parser.TEMP_OUTPUT_DIR, "second"))
@@ -0,0 +1,45 @@
+#gemini_client tests
+
+import asyncio
+import concurrent.futures
+import os
+import subprocess
+import sys
+
+import pytest
+
+from utils.gemini_client import FakeModel, GeminiClient, SharedTokenBucket, TokenBucket
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def test_shared_buckets_draw_from_one_quota():
+    # One token a minute after a burst of two: whoever is second in line after the burst has to wait.
+    first = SharedTokenBucket("limit.db", rate_per_minute=1, burst=2)
+    second = SharedTokenBucket("limit.db", rate_per_minute=1, burst=2)
+    assert first._take() == 0
+    assert second._take() == 0
+    assert second._take() > 50
+    assert first._take() > 50
+
+def test_buckets_in_other_processes_share_the_quota():
+    take_burst = "from utils.gemini_client import SharedTokenBucket\n" \
+                 "bucket = SharedTokenBucket('limit.db', rate_per_minute=1, burst=3)\n" \
+                 "assert [bucket._take() for _ in range(3)] == [0, 0, 0]\n"
+    subprocess.run([sys.executable, "-c", take_burst], env=dict(os.environ, PYTHONPATH=ROOT), check=True)
+    assert SharedTokenBucket("limit.db", rate_per_minute=1, burst=3)._take() > 0
+
+def test_separate_local_buckets_do_not_share():
+    async def take_burst():
+        for _ in range(2):
+            await asyncio.wait_for(TokenBucket(rate_per_minute=1, burst=2).acquire(), timeout=1)
+    asyncio.run(take_burst())
+
+def test_clients_with_a_rate_limit_file_share_it():
+    clients = [GeminiClient(FakeModel(lambda prompt: "ok"), requests_per_minute=1, rate_limit_file="limit.db") for _ in range(2)]
+    assert clients[0].generate("first") == "ok"
+    # At one request a minute the burst is a single call, and the first client has used it.
+    loop = clients[1]._ensure_loop()
+    future = asyncio.run_coroutine_threadsafe(clients[1].bucket.acquire(), loop)
+    with pytest.raises(concurrent.futures.TimeoutError):
+        future.result(timeout=1)
+    future.cancel()
@@ -0,0 +1,83 @@
+#jobs tests
+
+import os
+import subprocess
+import sys
+
+from benchmarks.bench_mineru_cache import BenchFile
+from utils import ai_processing, doc_parser, jobs, llm_cache
+
+def dead_pid():
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+def claim_and_lose_worker():
+    # Claims the next job, then makes it look as if the worker that took it has died.
+    job = jobs.claim_next_job()
+    jobs.get_connection().execute("UPDATE jobs SET worker_pid = ? WHERE job_id = ?", (dead_pid(), job['job_id']))
+    return job
+
+def status(job_id):
+    return jobs.get_job(job_id)['status']
+
+def test_a_job_whose_worker_died_is_requeued():
+    job_id = jobs.submit_job("validate", {})
+    claim_and_lose_worker()
+    assert status(job_id) == jobs.RUNNING
+    jobs.requeue_stale_jobs()
+    assert status(job_id) == jobs.QUEUED
+    assert jobs.claim_next_job()['job_id'] == job_id
+
+def test_a_job_with_a_live_worker_is_left_running():
+    job_id = jobs.submit_job("validate", {})
+    jobs.claim_next_job()
+    jobs.requeue_stale_jobs()
+    assert status(job_id) == jobs.RUNNING
+
+def test_a_job_that_keeps_losing_its_worker_is_failed(monkeypatch):
+    monkeypatch.setattr(jobs, "MAX_JOB_ATTEMPTS", 2)
+    job_id = jobs.submit_job("process_document", {"path": "missing.pdf", "name": "crash.pdf"})
+    claim_and_lose_worker()
+    jobs.requeue_stale_jobs()
+    assert status(job_id) == jobs.QUEUED
+    claim_and_lose_worker()
+    jobs.requeue_stale_jobs()
+    job = jobs.get_job(job_id)
+    assert job['status'] == jobs.FAILED
+    assert "tried 2 times" in job['error']
+    assert jobs.claim_next_job() is None
+
+def test_only_queued_or_running_jobs_are_joined():
+    first = jobs.submit_job("validate", {}, dedupe_key="same")
+    assert jobs.submit_job("validate", {}, dedupe_key="same") == first
+    jobs.finish_job(jobs.claim_next_job()['job_id'], result={})
+    assert jobs.submit_job("validate", {}, dedupe_key="same") != first
+
+# Fast paths the Production page takes instead of queueing a job.
+
+def cache_document(monkeypatch, data, markdown):
+    monkeypatch.setattr(doc_parser, "get_mineru_version", lambda: "test")
+    file_hash = doc_parser.compute_file_hash(BenchFile("spec.pdf", data))
+    md_path = doc_parser.get_cache_md_path(file_hash)
+    os.makedirs(os.path.dirname(md_path))
+    with open(md_path, "w", encoding="utf-8") as f:
+        f.write(markdown)
+    doc_parser.record_cached_md(file_hash, "spec.pdf")
+
+def test_a_known_document_is_served_from_the_caches(monkeypatch):
+    cache_document(monkeypatch, b"%PDF known", "# Spec")
+    assert jobs.process_document_from_cache(BenchFile("spec.pdf", b"%PDF known")) is None
+    specs = {"material": "Citrate", "parameters": [{"name": "pH", "type": "numeric_range", "min": 5, "max": 7}]}
+    llm_cache.put("specs", ai_processing.specs_cache_key("# Spec"), specs)
+    assert jobs.process_document_from_cache(BenchFile("spec.pdf", b"%PDF known")) is None
+    llm_cache.put("summary", ai_processing.summary_cache_key("# Spec"), "Citrate specification.")
+    assert jobs.process_document_from_cache(BenchFile("spec.pdf", b"%PDF known")) == {"specs": specs, "summary": "Citrate specification."}
+    assert jobs.process_document_from_cache(BenchFile("spec.pdf", b"%PDF new")) is None
+
+def test_validation_needs_the_model_only_for_undecided_text():
+    specs = [{"name": "pH", "type": "numeric_range", "min": 5, "max": 7, "spec": "5 - 7"},
+             {"name": "Description", "type": "text", "spec": "White powder"}]
+    assert not ai_processing.needs_model_validation(specs, {"pH": 6, "Description": "complies"}, "Citrate")
+    assert not ai_processing.needs_model_validation(specs, {"pH": 6}, "Citrate")
+    assert ai_processing.needs_model_validation(specs, {"pH": 6, "Description": "off-white lumps"}, "Citrate")
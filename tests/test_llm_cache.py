@@ -0,0 +1,43 @@
+#llm_cache tests
+
+import os
+import sqlite3
+
+import pytest
+
+from utils import llm_cache
+
+def test_namespaces_do_not_share_keys():
+    llm_cache.put("specs", "document", {"parameters": []})
+    llm_cache.put("summary", "document", "A summary.")
+    assert llm_cache.get("specs", "document") == {"parameters": []}
+    assert llm_cache.get("summary", "document") == "A summary."
+    llm_cache.invalidate(namespace="summary", key="document")
+    assert llm_cache.get("summary", "document") is None
+    assert llm_cache.get("specs", "document") == {"parameters": []}
+
+def test_invalidating_a_key_needs_its_namespace():
+    with pytest.raises(ValueError):
+        llm_cache.invalidate(key="document")
+
+def test_caches_keyed_by_key_alone_are_migrated():
+    os.makedirs(llm_cache.CACHE_DIR)
+    old = sqlite3.connect(llm_cache.CACHE_FILE)
+    old.execute("""
+        CREATE TABLE entries (
+            key TEXT PRIMARY KEY,
+            namespace TEXT NOT NULL,
+            value TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            last_access REAL NOT NULL
+        )
+    """)
+    old.execute("INSERT INTO entries VALUES ('document', 'specs', '{\"parameters\": []}', strftime('%s','now'), strftime('%s','now'))")
+    old.commit()
+    old.close()
+
+    assert llm_cache.get("specs", "document") == {"parameters": []}
+    llm_cache.put("summary", "document", "A summary.")
+    assert llm_cache.get("summary", "document") == "A summary."
+    primary_key = [column[1] for column in llm_cache.get_connection().execute("PRAGMA table_info(entries)") if column[5]]
+    assert primary_key == ["namespace", "key"]
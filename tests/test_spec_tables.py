@@ -0,0 +1,178 @@
+#spec_tables tests
+
+import json
+
+import pytest
+
+from utils import ai_processing, llm_cache, spec_tables
+from utils.gemini_client import FakeModel, GeminiClient
+
+SPEC_SHEET = """# Specification of Sodium Citrate
+
+<table>
+<tr><td>Name of Test</td><td>Specification</td></tr>
+<tr><td>pH</td><td>5.0 - 7.0</td></tr>
+<tr><td>Water content (by KF)</td><td>Between 2 and 3 % after drying</td></tr>
+<tr><td>Description</td><td>White crystalline powder</td></tr>
+</table>
+"""
+
+@pytest.mark.parametrize("spec, expected", [
+    ("5.0 - 7.0", {"type": "numeric_range", "min": 5.0, "max": 7.0}),
+    ("Between 2 and 3 %", {"type": "numeric_range", "min": 2, "max": 3}),
+    ("NMT 0.5%", {"type": "numeric_max", "max": 0.5}),
+    ("1.2 % max", {"type": "numeric_max", "max": 1.2}),
+    ("≤ 10 ppm", {"type": "numeric_max", "max": 10}),
+    ("Not less than 98.0 % w/w", {"type": "numeric_min", "min": 98.0}),
+    ("White crystalline powder", {"type": "text"}),
+])
+def test_classify_spec_recognised_layouts(spec, expected):
+    assert spec_tables.classify_spec(spec) == expected
+
+@pytest.mark.parametrize("spec", ["", "   ", "7.0 - 5.0", "Between 2 and 3 % after drying", "Complies with IP 2018, test 4"])
+def test_classify_spec_leaves_the_rest_to_the_model(spec):
+    assert spec_tables.classify_spec(spec) is None
+
+def test_salvage_extraction_keeps_complete_rows_of_a_truncated_response():
+    response = ('{"material": "Sodium \\"C\\" Citrate", "stage": "RM1", "parameters": ['
+                '{"name": "pH", "spec": "5-7", "type": "numeric_range", "min": 5, "max": 7}, '
+                '{"spec": "no name"}, '
+                '{"name": "Description", "spec": "White pow')
+    result = spec_tables.salvage_extraction(response)
+    assert result["material"] == 'Sodium "C" Citrate'
+    assert result["stage"] == "RM1"
+    assert [p["name"] for p in result["parameters"]] == ["pH"]
+
+def test_salvage_extraction_without_parameters():
+    assert spec_tables.salvage_extraction('{"material": "X", "param') == {"parameters": [], "material": "X"}
+
+def test_resolve_pending_fills_unclassified_rows_from_the_model():
+    extraction, sections = spec_tables.extract_specs_locally(SPEC_SHEET)
+    assert [p["type"] for p in extraction["parameters"]] == ["numeric_range", None, "text"]
+    assert len(sections) == 1 and "Water content" in sections[0] and "pH" not in sections[0]
+    llm = {"material": "Other", "parameters": [
+        {"name": "water  content (BY KF)", "spec": "2 - 3 %", "type": "numeric_range", "min": 2, "max": 3},
+        {"name": "Sulphate", "spec": "NMT 0.1%", "type": "numeric_max", "max": 0.1},
+    ]}
+    resolved = spec_tables.resolve_pending(extraction, llm)
+    assert resolved["material"] == "Sodium Citrate"
+    assert [(p["name"], p["type"]) for p in resolved["parameters"]] == [
+        ("pH", "numeric_range"), ("water  content (BY KF)", "numeric_range"), ("Description", "text"), ("Sulphate", "numeric_max"),
+    ]
+
+def test_resolve_pending_keeps_rows_the_model_dropped_unclassified():
+    extraction, _ = spec_tables.extract_specs_locally(SPEC_SHEET)
+    resolved = spec_tables.resolve_pending(extraction, {"parameters": []})
+    water = resolved["parameters"][1]
+    assert water["name"] == "Water content (by KF)"
+    assert water["type"] is None
+
+ROWSPAN_SHEET = """<table>
+<tr><td>S.No</td><td>Name of Test</td><td>Specification</td></tr>
+<tr><td>1</td><td>pH</td><td>5.0 - 7.0</td></tr>
+<tr><td rowspan="2">2</td><td>Impurity A</td><td>NMT 0.1%</td></tr>
+<tr><td>Impurity B</td><td>NMT 0.2%</td></tr>
+<tr><td>3</td><td>Heavy metals</td><td></td></tr>
+<tr><td></td><td></td><td></td></tr>
+</table>
+"""
+
+def test_rows_that_do_not_line_up_with_the_header_go_to_the_model():
+    extraction, sections = spec_tables.extract_specs_locally(ROWSPAN_SHEET)
+    # Impurity B's row is one cell short under the merged S.No; it is neither guessed at nor dropped.
+    assert [p["name"] for p in extraction["parameters"]] == ["pH", "Impurity A"]
+    assert len(sections) == 1
+    assert "Impurity B" in sections[0] and "Heavy metals" in sections[0]
+    # The row above a continuation goes along for context; rows that were parsed cleanly otherwise don't.
+    assert "Impurity A" in sections[0] and "pH" not in sections[0]
+
+def test_rowspan_rows_are_extracted_by_the_model(monkeypatch):
+    use_model(monkeypatch, lambda prompt: json.dumps({"parameters": [
+        {"name": "Impurity A", "spec": "NMT 0.1%", "type": "numeric_max", "max": 0.1},
+        {"name": "Impurity B", "spec": "NMT 0.2%", "type": "numeric_max", "max": 0.2},
+        {"name": "Heavy metals", "spec": "Complies", "type": "text"}]}))
+    success, specs = ai_processing.extract_specs_from_text(ROWSPAN_SHEET)
+    assert success and "warnings" not in specs
+    assert [(p["name"], p["type"]) for p in specs["parameters"]] == [
+        ("pH", "numeric_range"), ("Impurity A", "numeric_max"), ("Impurity B", "numeric_max"), ("Heavy metals", "text"),
+    ]
+
+PAGE_BREAK_SHEET = """<table><tr><td>Document No.</td><td>QC/SPEC/014</td></tr></table>
+
+<table>
+<tr><td>S.No</td><td>Name of Test</td><td>Specification</td></tr>
+<tr><td>1</td><td>pH</td><td>5.0 - 7.0</td></tr>
+<tr><td>2</td><td>Description</td><td>White crystalline powder</td></tr>
+</table>
+
+<table>
+<tr><td>3</td><td>Loss on drying</td><td>NMT 0.5% at 105°C</td></tr>
+<tr><td>4</td><td>Assay</td><td>98.0 - 102.0%</td></tr>
+</table>
+
+<table>
+<tr><td>Prepared by</td><td>Checked by</td></tr>
+<tr><td>A. Rao</td><td>S. Iyer</td></tr>
+</table>
+"""
+
+def test_tables_continued_after_a_page_break_are_kept():
+    extraction, sections = spec_tables.extract_specs_locally(PAGE_BREAK_SHEET)
+    assert [(p["name"], p["type"]) for p in extraction["parameters"]] == [
+        ("pH", "numeric_range"), ("Description", "text"), ("Loss on drying", None), ("Assay", "numeric_range"),
+    ]
+    assert extraction["parameters"][3]["min"] == 98.0
+    # The continuation's unclassified row goes to the model under the original header; the table that can't be
+    # matched goes whole, and the document-number table before the spec table is left out.
+    assert len(sections) == 2
+    assert "Name of Test" in sections[0] and "Loss on drying" in sections[0] and "Assay" not in sections[0]
+    assert "Prepared by" in sections[1]
+    assert not any("QC/SPEC/014" in section.split("<table>", 1)[1] for section in sections)
+
+def test_classify_manually():
+    param = {"name": "Water content (by KF)", "spec": "Between 2 and 3 % after drying", "type": None}
+    assert spec_tables.classify_manually(param, "2 - 3")["type"] == "numeric_range"
+    assert spec_tables.classify_manually(param, " Text ")["type"] == "text"
+    assert spec_tables.classify_manually(param, "roughly two") is None
+
+def use_model(monkeypatch, responder):
+    model = FakeModel(responder)
+    monkeypatch.setattr(ai_processing, "client", GeminiClient(model, requests_per_minute=1e9, max_retries=0))
+    return model
+
+def cached_specs(document_text):
+    key = llm_cache.make_key(llm_cache.normalize_markdown(document_text), ai_processing.SPEC_PROMPT_VERSION, ai_processing.MODEL_NAME)
+    return llm_cache.get("specs", key)
+
+def test_extraction_resolved_by_the_model_is_cached(monkeypatch):
+    use_model(monkeypatch, lambda prompt: json.dumps({"parameters": [
+        {"name": "Water content (by KF)", "spec": "2 - 3 %", "type": "numeric_range", "min": 2, "max": 3}]}))
+    success, specs = ai_processing.extract_specs_from_text(SPEC_SHEET)
+    assert success and "warnings" not in specs
+    assert [p["type"] for p in specs["parameters"]] == ["numeric_range", "numeric_range", "text"]
+    assert cached_specs(SPEC_SHEET) == specs
+
+def test_extraction_with_a_failed_model_call_is_partial(monkeypatch):
+    def fail(prompt):
+        raise ValueError("quota exhausted")
+    use_model(monkeypatch, fail)
+    success, specs = ai_processing.extract_specs_from_text(SPEC_SHEET)
+    assert success
+    assert [p["type"] for p in specs["parameters"]] == ["numeric_range", None, "text"]
+    assert any("quota exhausted" in warning for warning in specs["warnings"])
+    assert any("need manual classification" in warning for warning in specs["warnings"])
+    assert cached_specs(SPEC_SHEET) is None
+
+def test_extraction_with_a_dropped_row_is_partial(monkeypatch):
+    use_model(monkeypatch, lambda prompt: json.dumps({"parameters": []}))
+    success, specs = ai_processing.extract_specs_from_text(SPEC_SHEET)
+    assert success
+    assert specs["parameters"][1]["type"] is None
+    assert specs["warnings"] == ["1 parameter(s) need manual classification: Water content (by KF)."]
+    assert cached_specs(SPEC_SHEET) is None
+
+def test_unclassified_rows_fail_validation():
+    specs = [{"name": "Water content (by KF)", "spec": "Between 2 and 3 % after drying", "type": None}]
+    decision, breakdown = ai_processing.validate_qc_results(specs, {"Water content (by KF)": "2.5"})
+    assert decision.startswith("Fail")
+    assert breakdown[0]["Remarks"] == ai_processing.UNCLASSIFIED_REMARK
@@ -0,0 +1,53 @@
+#text_rules tests
+
+import pytest
+
+from utils import llm_cache, text_rules
+
+@pytest.mark.parametrize("observation", ["OK", " complies. ", "As per Spec", "Matches!"])
+def test_confirmations_pass(observation):
+    assert text_rules.match_locally("Citrate", "Description", "White powder", observation)[0] == "Pass"
+
+@pytest.mark.parametrize("observation", [None, "", "  ", "--"])
+def test_missing_observation_fails(observation):
+    assert text_rules.match_locally("Citrate", "Description", "White powder", observation) == ("Fail", "Input not provided.")
+
+def test_observation_matching_the_spec_passes():
+    assert text_rules.match_locally("Citrate", "Description", "White, crystalline powder", "crystalline powder white")[0] == "Pass"
+
+def test_other_observations_go_to_the_model():
+    assert text_rules.match_locally("Citrate", "Description", "White powder", "off-white lumps") is None
+
+def test_accepted_observations_are_learned_per_material():
+    text_rules.record_accepted("Citrate", "Description", "White powder", "Fine white powder")
+    assert text_rules.match_locally("citrate", "description", "White powder.", "fine  white powder")[0] == "Pass"
+    assert text_rules.match_locally("Lactose", "Description", "White powder", "Fine white powder") is None
+    assert text_rules.match_locally(None, "Description", "White powder", "Fine white powder") is None
+
+def test_learned_observations_survive_the_llm_cache(monkeypatch):
+    text_rules.record_accepted("Citrate", "Description", "White powder", "Fine white powder")
+    monkeypatch.setattr(llm_cache, "CACHE_MAX_ENTRIES", 1)
+    for i in range(3):
+        llm_cache.put("specs", f"document {i}", {"parameters": []})
+    llm_cache.invalidate()
+    assert text_rules.match_locally("Citrate", "Description", "White powder", "Fine white powder")[0] == "Pass"
+
+def test_learning_does_not_evict_cached_extractions(monkeypatch):
+    monkeypatch.setattr(llm_cache, "CACHE_MAX_ENTRIES", 1)
+    llm_cache.put("specs", "document", {"parameters": []})
+    for i in range(5):
+        text_rules.record_accepted("Citrate", "Description", "White powder", f"white powder lot {i}")
+    assert llm_cache.get("specs", "document") == {"parameters": []}
+
+def test_observations_learned_in_the_llm_cache_are_imported():
+    key = text_rules._learned_key("Citrate", "Description", "White powder", "Fine white powder")
+    llm_cache.put("accepted_observations", key, True)
+    assert text_rules.match_locally("Citrate", "Description", "White powder", "Fine white powder")[0] == "Pass"
+    assert llm_cache.get("accepted_observations", key) is None
+
+def test_forget_accepted_by_material():
+    text_rules.record_accepted("Citrate", "Description", "White powder", "Fine white powder")
+    text_rules.record_accepted("Lactose", "Description", "White powder", "Fine white powder")
+    text_rules.forget_accepted("CITRATE")
+    assert text_rules.match_locally("Citrate", "Description", "White powder", "Fine white powder") is None
+    assert text_rules.match_locally("Lactose", "Description", "White powder", "Fine white powder")[0] == "Pass"
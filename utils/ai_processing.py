@@ -1,32 +1,73 @@
 #ai_processing
 
-import google.generativeai as genai
 import os
 import json
-from dotenv import load_dotenv
+import threading
+from utils import llm_cache, metrics, spec_tables, text_rules
 
-load_dotenv()
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
 # --- FIX #1: Corrected the model name to the official, available version ---
-model = genai.GenerativeModel('gemini-2.0-flash-lite')
+MODEL_NAME = 'gemini-2.0-flash-lite'
+# Built by get_client() on the first Gemini call and shared by every session in the process.
+model = None
+client = None
+client_lock = threading.Lock()
+# Bump whenever the extraction prompt changes so cached results from the old prompt are not reused.
+SPEC_PROMPT_VERSION = 3
+SUMMARY_PROMPT_VERSION = 1
+UNCLASSIFIED_REMARK = "The specification type could not be determined; classify it manually before validating."
+
+def get_client():
+    # The genai SDK import, .env loading and genai.configure happen here rather than at import time,
+    # so pages and job workers that never call Gemini don't pay for them on a cold start.
+    global model, client
+    with client_lock:
+        if client is None:
+            import google.generativeai as genai
+            from dotenv import load_dotenv
+            from utils.gemini_client import RATE_LIMIT_FILE, GeminiClient
+            load_dotenv()
+            genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
+            model = genai.GenerativeModel(MODEL_NAME)
+            # Concurrency limit, rate limiting, retries and timeouts for every Gemini call. The rate limit
+            # is shared through RATE_LIMIT_FILE with the job workers and any other process on the host.
+            client = GeminiClient(model, rate_limit_file=RATE_LIMIT_FILE)
+        return client
+
+def summary_cache_key(markdown_text):
+    return llm_cache.make_key(llm_cache.normalize_markdown(markdown_text), SUMMARY_PROMPT_VERSION, MODEL_NAME)
+
+def specs_cache_key(document_text):
+    return llm_cache.make_key(llm_cache.normalize_markdown(document_text), SPEC_PROMPT_VERSION, MODEL_NAME)
+
+def get_cached_summary(markdown_text):
+    return llm_cache.get("summary", summary_cache_key(markdown_text))
+
+def get_cached_specs(document_text):
+    return llm_cache.get("specs", specs_cache_key(document_text))
 
 def summarize_document_context(markdown_text):
+    cache_key = summary_cache_key(markdown_text)
+    cached = llm_cache.get("summary", cache_key)
+    if cached is not None:
+        return cached
+
     prompt = f"Analyze the document content. Find the main title and document number. Write a single, concise paragraph summarizing the document's purpose.\n\nDocument Content:\n{markdown_text}"
     try:
-        response = model.generate_content(prompt)
-        return response.text.strip()
+        summary = get_client().generate(prompt).strip()
+        llm_cache.put("summary", cache_key, summary)
+        return summary
     except Exception as e:
         return f"Could not generate summary: {e}"
 
-def extract_specs_from_text(document_text):
-    prompt = f"""
+def build_extraction_prompt(document_text):
+    return f"""
     You are a meticulous data extraction robot. Your task is to analyze the provided Markdown, which contains HTML tables, and convert the relevant information into a single JSON object.
 
     Follow these steps precisely:
     1.  Identify the main material name, which might include a stage (e.g., "Methanol (R2)").
     2.  Locate the primary specification table, which will have columns like "Name of the test" and "Specification".
     3.  Iterate through each row of that table. For each row, extract the test name and its specification text.
-    4.  Determine the `type` for each specification ('text', 'numeric_range', 'numeric_max').
+    4.  Determine the `type` for each specification ('text', 'numeric_range', 'numeric_max', 'numeric_min').
     5.  Format everything into a single JSON object. The top-level key for the list of tests MUST be "parameters".
 
     Here is an example of the perfect output format:
@@ -49,6 +90,7 @@ def extract_specs_from_text(document_text):
       ]
     }}
 
+    The content may be only one part of a longer table; extract just the rows that are present.
     You MUST return ONLY the JSON object and nothing else.
 
     ## Document Content:
@@ -56,26 +98,132 @@ def extract_specs_from_text(document_text):
     
     ## JSON Output:
     """
-    try:
-        response = model.generate_content(prompt)
-        cleaned_response = response.text.strip().replace('```json', '').replace('```', '')
-        parsed_json = json.loads(cleaned_response)
 
-        param_list = parsed_json.get('parameters')
-        if not param_list:
-            error_msg = f"AI returned valid JSON, but the required 'parameters' key was missing.\n\nAI's Response:\n---\n{cleaned_response}\n---"
-            return False, error_msg
+@metrics.timed("spec_extraction")
+def extract_specs_from_text(document_text):
+    # Returns (True, specs) or (False, error message). Incomplete specs carry a "warnings" list for the user.
+    cache_key = specs_cache_key(document_text)
+    cached = llm_cache.get("specs", cache_key)
+    if cached is not None:
+        return True, cached
 
-        return True, parsed_json
+    # Rows with a recognisable spec layout are parsed locally; only the rest (plus the document
+    # heading) are sent to the model, split into chunks for long tables.
+    local_extraction, sections = spec_tables.extract_specs_locally(document_text)
+    print(f"Local spec parser classified {sum(1 for p in local_extraction['parameters'] if p['type'])} rows; {len(sections)} section(s) need the model.")
+    responses = get_client().generate_many([build_extraction_prompt(section) for section in sections], stream=True) if sections else []
 
-    except Exception as e:
-        raw_response = "N/A"
-        if 'response' in locals():
-            raw_response = response.text
-        error_msg = f"AI FAILED TO PRODUCE VALID JSON.\n\nPython Error: {e}\n\nAI's Raw, Unfiltered Response:\n---\n{raw_response}\n---"
-        return False, error_msg
+    # problems: full details for the log and the failure message; warnings: short notes returned with a partial result.
+    extractions, problems, warnings = [], [], []
+    for response_text in responses:
+        if isinstance(response_text, Exception):
+            problems.append(f"Python Error: {response_text}\n\nAI's Raw, Unfiltered Response:\n---\nN/A\n---")
+            warnings.append(f"A request to the AI failed ({response_text}); the rows it covered were not extracted.")
+            continue
+        cleaned_response = response_text.strip().replace('```json', '').replace('```', '')
+        try:
+            extractions.append(json.loads(cleaned_response))
+        except json.JSONDecodeError as e:
+            # Keep every complete row from a truncated or malformed response instead of losing the chunk.
+            extractions.append(spec_tables.salvage_extraction(cleaned_response))
+            problems.append(f"Python Error: {e}\n\nAI's Raw, Unfiltered Response:\n---\n{response_text}\n---")
+            warnings.append("The AI returned malformed JSON for one section; only its complete rows were kept.")
+
+    merged = spec_tables.resolve_pending(local_extraction, spec_tables.merge_extractions(extractions))
+    if not merged['parameters']:
+        if problems:
+            return False, "AI FAILED TO PRODUCE VALID JSON.\n\n" + "\n\n".join(problems)
+        raw_responses = "\n---\n".join(r for r in responses if not isinstance(r, Exception))
+        return False, f"AI returned valid JSON, but the required 'parameters' key was missing.\n\nAI's Response:\n---\n{raw_responses}\n---"
+    unclassified = [p['name'] for p in merged['parameters'] if p.get('type') is None]
+    if unclassified:
+        warnings.append(f"{len(unclassified)} parameter(s) need manual classification: {', '.join(unclassified)}.")
+    if warnings:
+        # A partial result is returned with its warnings but never cached.
+        print("Spec extraction is incomplete:\n" + "\n\n".join(problems or warnings))
+        merged['warnings'] = warnings
+    else:
+        llm_cache.put("specs", cache_key, merged)
+    return True, merged
+
+def invalidate_extraction_cache(document_text=None):
+    if document_text is None:
+        llm_cache.invalidate(namespace="specs")
+    else:
+        llm_cache.invalidate(namespace="specs", key=specs_cache_key(document_text))
+
+def build_text_validation_prompt(text_params):
+    return f"""
+    You are an intelligent Quality Control validation system. Analyze the following list of parameters. 
+    For each one, semantically compare the user's observation with the official specification. 
+    Understand the meaning, not just keywords.
+
+    INPUT JSON:
+    {json.dumps(text_params, indent=2)}
+
+    When validating the observation, you must use a balanced approach. 
+    The observation should be marked as Pass only if its meaning strongly matches the specification, 
+    or if the user gives a simple confirmation such as "yes", "ok", "done", "same", "matches", or anything that clearly indicates compliance. 
+    Shorter or simplified descriptions are acceptable as long as the meaning clearly fits within the boundaries defined by the specification. 
+    However, if the observation introduces anything new, unusual, unclear, or outside the specification—even slightly—it should be marked as Fail. 
+    If the observation partially matches but includes any contradictory detail, or conflicts with any part of the specification, 
+    it should also be marked as Fail.
+
+    EXAMPLE OUTPUT JSON:
+    {{
+      "validation_results": [
+        {{
+          "id": "Description",
+          "name": "Description",
+          "decision": "Pass",
+          "remark": "The user's observation 'clear liquid' matches the specification."
+        }},
+        {{
+          "id": "Residue on Evaporation",
+          "name": "Residue on Evaporation",
+          "decision": "Fail",
+          "remark": "The observation 'some particles' contradicts the 'No residue' specification."
+        }}
+      ]
+    }}
+
+    Return exactly one result per input item and copy its "id" unchanged.
+    You MUST return ONLY the JSON object and nothing else.
+    """
+
+def parse_text_validation_response(response_text):
+    cleaned_text = response_text.strip().replace('```json', '').replace('```', '')
+    ai_results = json.loads(cleaned_text).get("validation_results", [])
+    return {res.get("id", res.get("name")): res for res in ai_results}
+
+def validate_text_params_with_ai(text_params):
+    # text_params: [{"id", "name", "spec", "observation"}]. Returns {id: {"decision", "remark"}}; raises on API/JSON errors.
+    return parse_text_validation_response(get_client().generate(build_text_validation_prompt(text_params)))
 
-def validate_qc_results(specifications, qc_results):
+def validate_text_param_chunks_with_ai(chunks):
+    # Runs the chunks concurrently; each entry is a result map like validate_text_params_with_ai, or the exception it raised.
+    responses = get_client().generate_many([build_text_validation_prompt(chunk) for chunk in chunks])
+    results = []
+    for response in responses:
+        if isinstance(response, Exception):
+            results.append(response)
+            continue
+        try:
+            results.append(parse_text_validation_response(response))
+        except Exception as e:
+            results.append(e)
+    return results
+
+def needs_model_validation(specifications, qc_results, material=None):
+    # True when some text parameter can't be decided locally, i.e. validate_qc_results would call the model.
+    return any(
+        spec.get('type') == 'text'
+        and text_rules.match_locally(material, spec.get('name'), spec.get('spec'), qc_results.get(spec.get('name'))) is None
+        for spec in specifications
+    )
+
+@metrics.timed("validation")
+def validate_qc_results(specifications, qc_results, material=None):
     print("\n--- Entering Upgraded AI Validation ---")
     results_breakdown = []
     # --- FIX #2: Using the correct en-dash '–' to match the UI code ---
@@ -105,54 +253,33 @@ def validate_qc_results(specifications, qc_results):
                         if qc_value <= spec.get('max'):
                             pass_fail = "Pass"; remarks = f"Value is not more than {spec.get('max')}."
                         else: remarks = f"Value exceeds the maximum of {spec.get('max')}."
+                    elif param_type == 'numeric_min':
+                        if qc_value >= spec.get('min'):
+                            pass_fail = "Pass"; remarks = f"Value is not less than {spec.get('min')}."
+                        else: remarks = f"Value is below the minimum of {spec.get('min')}."
                 except (ValueError, TypeError): remarks = "Invalid numeric input."
             
             results_breakdown.append({"Parameter": param_name, "Spec": spec.get('spec'), "QC Result": qc_result, "Pass/Fail": pass_fail, "Remarks": remarks})
         elif param_type == 'text':
-            text_params_to_validate.append({"name": param_name, "spec": spec.get('spec'), "observation": qc_result})
+            local_match = text_rules.match_locally(material, param_name, spec.get('spec'), qc_result)
+            if local_match:
+                pass_fail, remarks = local_match
+                results_breakdown.append({"Parameter": param_name, "Spec": spec.get('spec'), "QC Result": qc_result, "Pass/Fail": pass_fail, "Remarks": remarks})
+            else:
+                text_params_to_validate.append({"name": param_name, "spec": spec.get('spec'), "observation": qc_result})
+        else:
+            # Unclassified (or unknown) specs could be numeric limits: never let them pass unchecked.
+            results_breakdown.append({"Parameter": param_name, "Spec": spec.get('spec'), "QC Result": qc_result, "Pass/Fail": "Fail", "Remarks": UNCLASSIFIED_REMARK})
 
-    #Step 2: Batch process all text parameters in a single AI call
-    if text_params_to_validate:
-        prompt = f"""
-        You are an intelligent Quality Control validation system. Analyze the following list of parameters. 
-        For each one, semantically compare the user's observation with the official specification. 
-        Understand the meaning, not just keywords.
-
-        INPUT JSON:
-        {json.dumps(text_params_to_validate, indent=2)}
-
-        When validating the observation, you must use a balanced approach. 
-        The observation should be marked as Pass only if its meaning strongly matches the specification, 
-        or if the user gives a simple confirmation such as "yes", "ok", "done", "same", "matches", or anything that clearly indicates compliance. 
-        Shorter or simplified descriptions are acceptable as long as the meaning clearly fits within the boundaries defined by the specification. 
-        However, if the observation introduces anything new, unusual, unclear, or outside the specification—even slightly—it should be marked as Fail. 
-        If the observation partially matches but includes any contradictory detail, or conflicts with any part of the specification, 
-        it should also be marked as Fail.
-
-        EXAMPLE OUTPUT JSON:
-        {{
-          "validation_results": [
-            {{
-              "name": "Description",
-              "decision": "Pass",
-              "remark": "The user's observation 'clear liquid' matches the specification."
-            }},
-            {{
-              "name": "Residue on Evaporation",
-              "decision": "Fail",
-              "remark": "The observation 'some particles' contradicts the 'No residue' specification."
-            }}
-          ]
-        }}
+    text_params_total = sum(1 for spec in specifications if spec.get('type') == 'text')
+    text_rules.count_decisions(local=text_params_total - len(text_params_to_validate), llm=len(text_params_to_validate))
 
-        You MUST return ONLY the JSON object and nothing else.
-        """
+    #Step 2: Batch process the remaining ambiguous text parameters in a single AI call
+    if text_params_to_validate:
         try:
-            response = model.generate_content(prompt)
-            cleaned_text = response.text.strip().replace('```json', '').replace('```', '')
-            ai_results = json.loads(cleaned_text).get("validation_results", [])
-            
-            ai_results_map = {res["name"]: res for res in ai_results}
+            ai_results_map = validate_text_params_with_ai(
+                [{"id": param["name"], **param} for param in text_params_to_validate]
+            )
 
             for param in text_params_to_validate:
                 param_name = param["name"]
@@ -160,6 +287,8 @@ def validate_qc_results(specifications, qc_results):
                 if ai_result:
                     pass_fail = ai_result.get("decision", "Fail")
                     remarks = ai_result.get("remark", "No remark from AI.")
+                    if pass_fail == "Pass":
+                        text_rules.record_accepted(material, param_name, param["spec"], param["observation"])
                 else:
                     pass_fail = "Fail"
                     remarks = "AI did not return a result for this parameter."
@@ -0,0 +1,238 @@
+#analytics_export
+
+import argparse
+import datetime
+import json
+import os
+import shutil
+import threading
+import time
+
+from utils import db, metrics
+
+EXPORT_DIR = os.path.join('data', 'analytics')
+# Files starting with "_" or "." are ignored by pyarrow's dataset discovery.
+STATE_FILE = os.path.join(EXPORT_DIR, '_export_state.json')
+# Bump when the columns change; the next export then rebuilds every month.
+EXPORT_SCHEMA_VERSION = 1
+READ_BATCH_SIZE = 1000
+
+# Streamlit sessions share the process; one export at a time keeps them off each other's temp files.
+export_lock = threading.Lock()
+
+COLUMNS = [
+    ("sample_id", "string"), ("request_date", "timestamp"), ("status", "string"),
+    ("material", "string"), ("stage", "string"), ("performed_by", "string"), ("final_decision", "string"),
+    ("parameter", "string"), ("spec_type", "string"), ("spec", "string"),
+    ("spec_min", "float64"), ("spec_max", "float64"),
+    ("production_value", "string"), ("production_numeric", "float64"),
+    ("qc_value", "string"), ("qc_numeric", "float64"),
+    ("within_spec", "bool"), ("qc_decision", "string"), ("qc_remark", "string"),
+]
+
+def _require_pyarrow():
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ImportError("The analytics export needs pyarrow. Install it with: pip install pyarrow")
+
+def get_schema():
+    import pyarrow as pa
+    types = {"string": pa.string(), "float64": pa.float64(), "bool": pa.bool_(), "timestamp": pa.timestamp("us")}
+    return pa.schema([(name, types[kind]) for name, kind in COLUMNS])
+
+def get_partitioning():
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    # Directories are named month=YYYY-MM, so month filters skip whole directories.
+    return ds.partitioning(pa.schema([("month", pa.string())]), flavor="hive")
+
+def load_state():
+    try:
+        with open(STATE_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_state(state):
+    os.makedirs(EXPORT_DIR, exist_ok=True)
+    tmp_path = f"{STATE_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+    os.replace(tmp_path, STATE_FILE)
+
+def to_float(value):
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return float(str(value).strip())
+    except ValueError:
+        return None
+
+def to_text(value):
+    return None if value is None else str(value)
+
+def parse_date(value):
+    try:
+        return datetime.datetime.fromisoformat(value) if value else None
+    except (TypeError, ValueError):
+        return None
+
+def analysis_by_parameter(analysis_results):
+    # analysis_results is either a validation breakdown (list of rows) or a {parameter: result} map.
+    if isinstance(analysis_results, list):
+        return {row.get("Parameter"): row for row in analysis_results if isinstance(row, dict)}
+    if isinstance(analysis_results, dict):
+        return {name: result if isinstance(result, dict) else {"Pass/Fail": result} for name, result in analysis_results.items()}
+    return {}
+
+def within_spec(spec, value):
+    if value is None or spec.get('type') not in ('numeric_range', 'numeric_max', 'numeric_min'):
+        return None
+    low, high = to_float(spec.get('min')), to_float(spec.get('max'))
+    return (low is None or value >= low) and (high is None or value <= high)
+
+def flatten_sample(sample):
+    # One row per specification parameter.
+    material_info = sample.get('material_info') or {}
+    production_inputs = sample.get('production_inputs') or {}
+    qc_inputs = sample.get('qc_inputs') or {}
+    analysis = analysis_by_parameter(sample.get('analysis_results'))
+    rows = []
+    for spec in sample.get('specifications') or []:
+        name = spec.get('name')
+        production_numeric = to_float(production_inputs.get(name))
+        qc_numeric = to_float(qc_inputs.get(name))
+        result = analysis.get(name) or {}
+        rows.append({
+            "sample_id": sample.get('sample_id'),
+            "request_date": parse_date(sample.get('request_date')),
+            "status": sample.get('status'),
+            "material": material_info.get('name'),
+            "stage": to_text(material_info.get('stage')),
+            "performed_by": to_text(sample.get('performed_by')),
+            "final_decision": to_text(sample.get('final_decision')),
+            "parameter": to_text(name),
+            "spec_type": spec.get('type'),
+            "spec": to_text(spec.get('spec')),
+            "spec_min": to_float(spec.get('min')),
+            "spec_max": to_float(spec.get('max')),
+            "production_value": to_text(production_inputs.get(name)),
+            "production_numeric": production_numeric,
+            "qc_value": to_text(qc_inputs.get(name)),
+            "qc_numeric": qc_numeric,
+            # QC's measurement when there is one, otherwise Production's.
+            "within_spec": within_spec(spec, qc_numeric if qc_numeric is not None else production_numeric),
+            "qc_decision": to_text(result.get("Pass/Fail")),
+            "qc_remark": to_text(result.get("Remarks")),
+        })
+    return rows
+
+def month_bounds(month):
+    first = datetime.date(int(month[:4]), int(month[5:7]), 1)
+    last = (first + datetime.timedelta(days=32)).replace(day=1) - datetime.timedelta(days=1)
+    return first, last
+
+def export_month(month):
+    # Rewrites one month's partition from the database; returns the number of rows written and the ids of its samples.
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    first, last = month_bounds(month)
+    rows, sample_ids, cursor = [], [], None
+    while True:
+        samples, cursor = db.query_samples(date_from=first, date_to=last, cursor=cursor, limit=READ_BATCH_SIZE)
+        for sample in samples:
+            sample_ids.append(sample.get('sample_id'))
+            rows.extend(flatten_sample(sample))
+        if cursor is None:
+            break
+    partition_dir = os.path.join(EXPORT_DIR, f"month={month}")
+    if not rows:
+        shutil.rmtree(partition_dir, ignore_errors=True)
+        return 0, sample_ids
+    # Sorted so each row group's min/max statistics let material and parameter filters skip it.
+    rows.sort(key=lambda row: (row["material"] or "", row["parameter"] or "", row["request_date"] or datetime.datetime.min))
+    os.makedirs(partition_dir, exist_ok=True)
+    tmp_path = os.path.join(partition_dir, f".part-0.{os.getpid()}.tmp")
+    pq.write_table(pa.Table.from_pylist(rows, schema=get_schema()), tmp_path, compression="zstd")
+    os.replace(tmp_path, os.path.join(partition_dir, "part-0.parquet"))
+    return len(rows), sample_ids
+
+def list_months():
+    if not os.path.isdir(EXPORT_DIR):
+        return []
+    return sorted(name.split("=", 1)[1] for name in os.listdir(EXPORT_DIR) if name.startswith("month="))
+
+@metrics.timed("analytics.export")
+def export_samples(full=False):
+    # Incremental by default: only the months holding samples changed since the last export (read from
+    # the db change log) are rewritten, along with the months those samples were exported under before,
+    # so a sample whose request_date moved (or that was deleted) leaves its old month too.
+    _require_pyarrow()
+    with export_lock:
+        return _export(full)
+
+def _export(full):
+    state = load_state()
+    # Taken before reading, so a write that lands during the export is picked up by the next one.
+    seq = db.get_change_seq()
+    changed_ids = None
+    # sample_id -> the month its rows were last exported under.
+    sample_months = state.get("sample_months")
+    if (not full and state.get("schema_version") == EXPORT_SCHEMA_VERSION and state.get("seq") is not None
+            and sample_months is not None):
+        _, changed_ids = db.get_changes_since(state["seq"])
+    if changed_ids is None:
+        sample_months = {}
+        months = set(db.get_request_months())
+        for stale in set(list_months()) - months:
+            shutil.rmtree(os.path.join(EXPORT_DIR, f"month={stale}"), ignore_errors=True)
+    else:
+        months = {date[:7] for date in db.get_request_dates(changed_ids).values() if date}
+        months |= {sample_months[sample_id] for sample_id in changed_ids if sample_id in sample_months}
+
+    rows = 0
+    sample_months = {sample_id: month for sample_id, month in sample_months.items() if month not in months}
+    for month in sorted(months):
+        month_rows, sample_ids = export_month(month)
+        rows += month_rows
+        sample_months.update(dict.fromkeys(sample_ids, month))
+    save_state({"schema_version": EXPORT_SCHEMA_VERSION, "seq": seq, "exported_at": time.time(), "sample_months": sample_months})
+    return {"full": changed_ids is None, "months": sorted(months), "rows": rows, "seq": seq}
+
+def query_results(columns=None, month_from=None, month_to=None, materials=None, parameters=None, statuses=None):
+    # Filters are pushed down to pyarrow: month bounds prune partitions, the rest use Parquet statistics.
+    _require_pyarrow()
+    import pyarrow.dataset as ds
+
+    if not list_months():
+        import pandas as pd
+        return pd.DataFrame(columns=columns or [name for name, _ in COLUMNS] + ["month"])
+    dataset = ds.dataset(EXPORT_DIR, format="parquet", partitioning=get_partitioning())
+    conditions = []
+    if month_from:
+        conditions.append(ds.field("month") >= month_from)
+    if month_to:
+        conditions.append(ds.field("month") <= month_to)
+    for column, values in (("material", materials), ("parameter", parameters), ("status", statuses)):
+        if values:
+            conditions.append(ds.field(column).isin(list(values)))
+    condition = None
+    for item in conditions:
+        condition = item if condition is None else condition & item
+    return dataset.to_table(columns=columns, filter=condition).to_pandas()
+
+def exported_seq():
+    return load_state().get("seq")
+
+def main():
+    parser = argparse.ArgumentParser(description="Export samples to a month-partitioned Parquet dataset for analytics.")
+    parser.add_argument("--full", action="store_true", help="Rebuild every month instead of only the changed ones.")
+    args = parser.parse_args()
+    summary = export_samples(full=args.full)
+    print(f"Exported {summary['rows']} rows across {len(summary['months'])} month(s) "
+          f"({'full rebuild' if summary['full'] else 'incremental'}) up to change {summary['seq']}.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+#batch_validation
+
+import numpy as np
+import pandas as pd
+
+from utils import ai_processing, db, metrics, text_rules
+
+PASS_DECISION = "Pass – Proceed to Next Stage"
+FAIL_DECISION = "Fail – Material Rejected"
+NUMERIC_TYPES = ['numeric_range', 'numeric_max', 'numeric_min']
+DEFAULT_TEXT_CHUNK_SIZE = 50
+# Stored samples are read and validated this many at a time.
+REVALIDATE_PAGE_SIZE = 500
+
+def spec_kind(spec):
+    if spec.get('type') in NUMERIC_TYPES:
+        return 'numeric'
+    return 'text' if spec.get('type') == 'text' else 'unclassified'
+
+def resolve_specifications(sample, specifications):
+    # None: each sample's stored specs; list: one spec set for every sample; dict: spec set per material name.
+    if specifications is None:
+        return sample.get('specifications') or []
+    if isinstance(specifications, dict):
+        material = (sample.get('material_info') or {}).get('name')
+        return specifications.get(material, sample.get('specifications') or [])
+    return specifications
+
+def group_by_spec_set(samples, specifications=None):
+    # Samples sharing a spec set are validated together as one (samples x parameters) block.
+    groups = {}
+    for position, sample in enumerate(samples):
+        if not sample:
+            continue
+        specs = resolve_specifications(sample, specifications)
+        key = tuple((spec.get('name'), spec.get('type'), spec.get('spec'), spec.get('min'), spec.get('max')) for spec in specs)
+        groups.setdefault(key, (specs, []))[1].append((position, sample))
+    return list(groups.values())
+
+def numeric_remark_templates(specs):
+    # Remark text depends only on the parameter and the outcome, so it is built once per parameter.
+    pass_text, fail_text = [], []
+    for spec in specs:
+        lo, hi = spec.get('min'), spec.get('max')
+        if spec.get('type') == 'numeric_range':
+            pass_text.append("Value is within range.")
+            fail_text.append(f"Value is outside the range of {lo} - {hi}.")
+        elif spec.get('type') == 'numeric_max':
+            pass_text.append(f"Value is not more than {hi}.")
+            fail_text.append(f"Value exceeds the maximum of {hi}.")
+        else:
+            pass_text.append(f"Value is not less than {lo}.")
+            fail_text.append(f"Value is below the minimum of {lo}.")
+    count = len(specs)
+    return np.array([["Input not provided."] * count, ["Invalid numeric input."] * count, pass_text, fail_text], dtype=object)
+
+def evaluate_numeric(specs, raw):
+    # raw: (samples x parameters) DataFrame of submitted values. Returns (passed, remarks) matrices of the same shape.
+    types = np.array([spec.get('type') for spec in specs], dtype=object)
+    lo = np.array([np.nan if spec.get('min') is None else spec.get('min') for spec in specs], dtype=float)
+    hi = np.array([np.nan if spec.get('max') is None else spec.get('max') for spec in specs], dtype=float)
+
+    raw_values = raw.to_numpy(dtype=object)
+    values = pd.DataFrame(raw_values).apply(pd.to_numeric, errors='coerce').to_numpy(dtype=float)
+    missing = pd.isna(raw_values)
+    # Only cells that failed to parse can be blank strings, so check just those.
+    unparsed = ~missing & np.isnan(values)
+    missing[unparsed] = [isinstance(value, str) and not value.strip() for value in raw_values[unparsed]]
+    invalid = ~missing & np.isnan(values)
+
+    with np.errstate(invalid='ignore'):
+        above_min = values >= lo
+        below_max = values <= hi
+    passed = np.where(types == 'numeric_range', above_min & below_max, np.where(types == 'numeric_max', below_max, above_min))
+    passed &= ~(missing | invalid)
+
+    codes = np.where(missing, 0, np.where(invalid, 1, np.where(passed, 2, 3)))
+    remarks = numeric_remark_templates(specs)[codes, np.arange(len(specs))]
+    return passed, remarks
+
+def evaluate_text(frame, use_llm=True, text_chunk_size=DEFAULT_TEXT_CHUNK_SIZE):
+    decisions = pd.Series("Fail", index=frame.index, dtype=object)
+    remarks = pd.Series("", index=frame.index, dtype=object)
+    unresolved = {}
+    for idx, material, name, spec, observation in zip(frame.index, frame["material"], frame["Parameter"], frame["Spec"], frame["QC Result"]):
+        observation = None if observation is None or observation != observation else observation
+        local_match = text_rules.match_locally(material, name, spec, observation)
+        if local_match:
+            decisions.loc[idx], remarks.loc[idx] = local_match
+        else:
+            # Identical spec/observation pairs across samples only need to be judged once.
+            unresolved.setdefault((name, spec, observation), []).append(idx)
+    text_rules.count_decisions(local=len(frame) - sum(len(v) for v in unresolved.values()), llm=sum(len(v) for v in unresolved.values()))
+
+    if not use_llm:
+        for indices in unresolved.values():
+            decisions.loc[indices] = "Not Validated"
+            remarks.loc[indices] = "Requires AI validation (skipped)."
+        return decisions, remarks
+
+    items = [{"id": f"t{i}", "name": key[0], "spec": key[1], "observation": key[2]} for i, key in enumerate(unresolved)]
+    keys = list(unresolved)
+    chunks = [items[start:start + text_chunk_size] for start in range(0, len(items), text_chunk_size)]
+    chunk_results = ai_processing.validate_text_param_chunks_with_ai(chunks) if chunks else []
+    for chunk_index, (chunk, ai_results_map) in enumerate(zip(chunks, chunk_results)):
+        chunk_keys = keys[chunk_index * text_chunk_size:(chunk_index + 1) * text_chunk_size]
+        for item, key in zip(chunk, chunk_keys):
+            indices = unresolved[key]
+            if isinstance(ai_results_map, Exception):
+                decisions.loc[indices] = "Fail"
+                remarks.loc[indices] = f"A batch AI validation error occurred: {ai_results_map}"
+                continue
+            ai_result = ai_results_map.get(item["id"])
+            if ai_result:
+                decisions.loc[indices] = ai_result.get("decision", "Fail")
+                remarks.loc[indices] = ai_result.get("remark", "No remark from AI.")
+                if ai_result.get("decision") == "Pass":
+                    # Learned per material, as in validate_qc_results, so repeats are decided locally next time.
+                    for material in set(frame.loc[indices, "material"]):
+                        text_rules.record_accepted(material, *key)
+            else:
+                decisions.loc[indices], remarks.loc[indices] = "Fail", "AI did not return a result for this parameter."
+    return decisions, remarks
+
+@metrics.timed("validation.batch")
+def validate_samples_batch(samples, specifications=None, inputs_key='production_inputs', use_llm=True, text_chunk_size=DEFAULT_TEXT_CHUNK_SIZE):
+    frames = []
+    for specs, group in group_by_spec_set(samples, specifications):
+        positions = np.array([position for position, _ in group])
+        sample_ids = np.array([sample.get('sample_id') for _, sample in group], dtype=object)
+        materials = np.array([(sample.get('material_info') or {}).get('name') for _, sample in group], dtype=object)
+        inputs = [sample.get(inputs_key) or {} for _, sample in group]
+
+        # Unclassified or unknown spec types fail, as in validate_qc_results.
+        for kind in ('numeric', 'text', 'unclassified'):
+            selected = [(order, spec) for order, spec in enumerate(specs) if spec_kind(spec) == kind]
+            if not selected:
+                continue
+            orders = np.array([order for order, _ in selected])
+            kind_specs = [spec for _, spec in selected]
+            names = [spec.get('name') for spec in kind_specs]
+            raw = pd.DataFrame(inputs, columns=names, dtype=object).reindex(columns=names)
+            num_samples, num_params = raw.shape
+            frame = pd.DataFrame({
+                "position": np.repeat(positions, num_params),
+                "order": np.tile(orders, num_samples),
+                "sample_id": np.repeat(sample_ids, num_params),
+                "material": np.repeat(materials, num_params),
+                "Parameter": np.tile(np.array(names, dtype=object), num_samples),
+                "Spec": np.tile(np.array([spec.get('spec') for spec in kind_specs], dtype=object), num_samples),
+                "QC Result": raw.to_numpy(dtype=object).ravel(),
+            })
+            if kind == 'numeric':
+                passed, remarks = evaluate_numeric(kind_specs, raw)
+                frame["Pass/Fail"] = np.where(passed.ravel(), "Pass", "Fail")
+                frame["Remarks"] = remarks.ravel()
+            elif kind == 'unclassified':
+                frame["Pass/Fail"] = "Fail"
+                frame["Remarks"] = ai_processing.UNCLASSIFIED_REMARK
+            else:
+                decisions, remarks = evaluate_text(frame, use_llm, text_chunk_size)
+                frame["Pass/Fail"] = decisions
+                frame["Remarks"] = remarks
+            frames.append(frame)
+
+    if not frames:
+        return pd.DataFrame(columns=["sample_id", "material", "Parameter", "Spec", "QC Result", "Pass/Fail", "Remarks", "Final Decision"])
+    results = pd.concat(frames, ignore_index=True).sort_values(["position", "order"], kind="stable").reset_index(drop=True)
+    failed = results["Pass/Fail"].ne("Pass").groupby(results["position"]).transform("any")
+    results["Final Decision"] = np.where(failed, FAIL_DECISION, PASS_DECISION)
+    return results.drop(columns=["position", "order"])
+
+def revalidate_stored_samples(specifications=None, status=None, page_size=REVALIDATE_PAGE_SIZE, **kwargs):
+    # Pages through the status index instead of loading the whole table; each page is validated as it is read.
+    pages, cursor = [], None
+    while True:
+        samples, cursor = db.query_samples(status=status, cursor=cursor, limit=page_size)
+        if samples:
+            pages.append(validate_samples_batch(samples, specifications, **kwargs))
+        if cursor is None:
+            break
+    if not pages:
+        return validate_samples_batch([], specifications, **kwargs)
+    return pd.concat(pages, ignore_index=True)
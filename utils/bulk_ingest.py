@@ -0,0 +1,189 @@
+#bulk_ingest
+
+import argparse
+import json
+import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from utils import ai_processing
+from utils import doc_parser
+from utils.doc_parser import (
+    TEMP_INPUT_DIR, UploadTooLarge, compute_file_hash, get_cache_md_path, get_mineru_executable_path,
+    get_upload_size, lookup_cached_md_path, read_md, record_cached_md, run_mineru, save_upload
+)
+
+SUPPORTED_EXTENSIONS = ('.pdf', '.docx', '.doc')
+DEFAULT_WORKERS = 2
+DEFAULT_BATCH_SIZE = 8
+
+class LocalFile:
+    # Minimal stand-in for Streamlit's UploadedFile so the CLI can share the same code path.
+    def __init__(self, path):
+        self.path = path
+        self.name = os.path.basename(path)
+
+    def getvalue(self):
+        with open(self.path, 'rb') as f:
+            return f.read()
+
+def collect_local_files(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.lower().endswith(SUPPORTED_EXTENSIONS):
+                    files.append(LocalFile(os.path.join(path, name)))
+        elif os.path.isfile(path):
+            files.append(LocalFile(path))
+    return files
+
+def convert_batch(mineru_exe, batch):
+    # One Mineru process per batch directory instead of one per file, so model loading is paid once per batch.
+    batch_dir = os.path.join(TEMP_INPUT_DIR, f"batch_{uuid.uuid4().hex}")
+    os.makedirs(batch_dir, exist_ok=True)
+    try:
+        for item in batch:
+            # Already on disk from staging: linked into the batch rather than written again.
+            target = os.path.join(batch_dir, os.path.basename(item['path']))
+            if os.path.exists(target):
+                continue
+            try:
+                os.link(item['path'], target)
+            except OSError:
+                shutil.copyfile(item['path'], target)
+        error_message = run_mineru(mineru_exe, batch_dir)
+    finally:
+        shutil.rmtree(batch_dir, ignore_errors=True)
+
+    # Paths, not contents: each document's Markdown is only read when its specs are extracted.
+    results = {}
+    for item in batch:
+        md_file_path = get_cache_md_path(item['hash'])
+        if os.path.exists(md_file_path):
+            record_cached_md(item['hash'], item['file'].name)
+            results[item['hash']] = (True, md_file_path)
+        else:
+            results[item['hash']] = (False, error_message or f"Error: Mineru ran, but the output file was not found at {md_file_path}.")
+    return results
+
+def ingest_files(files, workers=DEFAULT_WORKERS, batch_size=DEFAULT_BATCH_SIZE, extract_specs=True, progress_callback=None):
+    # Keyed by position in `files`: two uploads can share a name.
+    results = {}
+    lock = threading.Lock()
+
+    def report(index, **fields):
+        with lock:
+            entry = results.setdefault(index, {"index": index, "file": files[index].name, "status": "queued",
+                                               "material": None, "parameters": 0, "specs": None, "error": None})
+            entry.update(fields)
+            snapshot = dict(entry)
+        if progress_callback:
+            progress_callback(snapshot)
+
+    def finish(item, ok, result):
+        # result is the Markdown file's path, or an error message when conversion failed.
+        index = item['index']
+        if not ok:
+            report(index, status="failed", error=result)
+            return
+        if not extract_specs:
+            report(index, status="done")
+            return
+        report(index, status="extracting")
+        success, specs = ai_processing.extract_specs_from_text(read_md(result))
+        if success:
+            # Incomplete extractions are kept but flagged, with the reasons in the error column.
+            report(index, status="needs review" if specs.get('warnings') else "done", error="; ".join(specs.get('warnings', [])) or None,
+                   material=specs.get('material'), parameters=len(specs.get('parameters', [])), specs=specs)
+        else:
+            report(index, status="failed", error=specs)
+
+    # Cached documents are only hashed; the rest are streamed to disk once and Mineru batches are built from these copies.
+    staging_dir = os.path.join(TEMP_INPUT_DIR, f"bulk_{uuid.uuid4().hex}")
+    try:
+        pending = []
+        for index, uploaded_file in enumerate(files):
+            report(index)
+            if get_upload_size(uploaded_file) > doc_parser.UPLOAD_MAX_BYTES:
+                report(index, status="failed",
+                       error=f"Error: '{uploaded_file.name}' is over the {doc_parser.UPLOAD_MAX_BYTES // (1024 * 1024)} MB limit per document (UPLOAD_MAX_MB).")
+                continue
+            item = {"index": index, "file": uploaded_file, "hash": compute_file_hash(uploaded_file)}
+            md_file_path = lookup_cached_md_path(item['hash'])
+            if md_file_path is not None:
+                item['md_path'] = md_file_path
+            else:
+                try:
+                    item['hash'], item['path'] = save_upload(uploaded_file, staging_dir)
+                except UploadTooLarge as e:
+                    report(index, status="failed", error=f"Error: {e}")
+                    continue
+            pending.append(item)
+
+        to_convert = [item for item in pending if 'md_path' not in item]
+        mineru_exe = get_mineru_executable_path() if to_convert else None
+        if to_convert and not mineru_exe:
+            for item in to_convert:
+                report(item['index'], status="failed", error="Error: Could not locate the Mineru executable. Please check your installation.")
+            to_convert = []
+
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            extraction_futures = [executor.submit(finish, item, True, item['md_path']) for item in pending if 'md_path' in item]
+            futures = {}
+            for start in range(0, len(to_convert), batch_size):
+                batch = to_convert[start:start + batch_size]
+                for item in batch:
+                    report(item['index'], status="converting")
+                futures[executor.submit(convert_batch, mineru_exe, batch)] = batch
+
+            for future in as_completed(futures):
+                batch = futures[future]
+                try:
+                    converted = future.result()
+                except Exception as e:
+                    for item in batch:
+                        report(item['index'], status="failed", error=f"Bulk ingestion error: {e}")
+                    continue
+                for item in batch:
+                    ok, result = converted[item['hash']]
+                    extraction_futures.append(executor.submit(finish, item, ok, result))
+            for future in extraction_futures:
+                future.result()
+
+        return [results[index] for index in range(len(files))]
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert and extract specifications from a batch of spec sheets.")
+    parser.add_argument("paths", nargs="+", help="Files or directories containing .pdf/.docx/.doc spec sheets.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Number of concurrent Mineru processes.")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE, help="Documents handed to each Mineru process.")
+    parser.add_argument("--no-extract", action="store_true", help="Only convert to Markdown, skip spec extraction.")
+    parser.add_argument("--out", help="Write the per-file results as JSON to this path.")
+    args = parser.parse_args()
+
+    files = collect_local_files(args.paths)
+    if not files:
+        parser.error("No supported documents found.")
+
+    def print_progress(entry):
+        if entry['status'] in ("done", "needs review", "failed"):
+            detail = entry['error'].splitlines()[0] if entry['error'] else f"{entry['parameters']} parameters"
+            print(f"[{entry['status'].upper()}] {entry['file']}: {detail}")
+
+    results = ingest_files(files, workers=args.workers, batch_size=args.batch_size,
+                           extract_specs=not args.no_extract, progress_callback=print_progress)
+    failed = sum(1 for r in results if r['status'] == "failed")
+    review = sum(1 for r in results if r['status'] == "needs review")
+    print(f"Processed {len(results)} documents, {failed} failed, {review} need review.")
+    if args.out:
+        with open(args.out, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    raise SystemExit(main())
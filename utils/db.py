@@ -1,45 +1,292 @@
-#db.py 
-
-import json
-import os
-import threading
-
-file_lock = threading.Lock()
-DATA_DIR = 'data'
-SAMPLES_FILE = os.path.join(DATA_DIR, 'samples.json')
-
-def ensure_data_dir_exists():
-    if not os.path.exists(DATA_DIR):
-        os.makedirs(DATA_DIR)
-    if not os.path.exists(SAMPLES_FILE):
-        with open(SAMPLES_FILE, 'w', encoding='utf-8') as f:
-            json.dump([], f)
-
-def read_json_file(file_path):
-    with file_lock:
-        try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
-        except (FileNotFoundError, json.JSONDecodeError):
-            return []
-
-def write_json_file(file_path, data):
-    with file_lock:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, indent=2)
-
-def get_samples():
-    return read_json_file(SAMPLES_FILE)
-
-def save_sample(sample_data):
-    samples = get_samples()
-    samples.append(sample_data)
-    write_json_file(SAMPLES_FILE, samples)
-    
-def update_sample(sample_id, updated_data):
-    samples = get_samples()
-    for i, sample in enumerate(samples):
-        if sample.get('sample_id') == sample_id:
-            samples[i].update(updated_data)
-            break
-    write_json_file(SAMPLES_FILE, samples)
\ No newline at end of file
+#db.py
+
+import datetime
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from utils import metrics
+
+DATA_DIR = 'data'
+SAMPLES_FILE = os.path.join(DATA_DIR, 'samples.json')
+DB_FILE = os.path.join(DATA_DIR, 'samples.db')
+SCHEMA_VERSION = 1
+# How many entries of the change log are kept; readers further behind than this reload everything.
+CHANGE_LOG_KEEP = 10000
+
+_local = threading.local()
+# Why samples.json could not be imported, while it can't; the import is retried until it succeeds.
+migration_error = None
+# Called with the new change sequence number after every committed write in this process.
+change_listeners = []
+
+def get_connection():
+    # One connection per thread; WAL lets readers in other processes keep going while we write.
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        os.makedirs(DATA_DIR, exist_ok=True)
+        conn = sqlite3.connect(DB_FILE, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _local.conn = conn
+    return conn
+
+def init_schema(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS samples (
+            sample_id TEXT PRIMARY KEY,
+            status TEXT,
+            material TEXT,
+            request_date TEXT,
+            data TEXT NOT NULL
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_samples_status ON samples(status)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_samples_status_date ON samples(status, request_date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_samples_material_date ON samples(material, request_date)")
+    # Append-only change log: the highest seq is the store's version, and the rows say which samples changed.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS sample_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            sample_id TEXT NOT NULL,
+            changed_at REAL NOT NULL
+        )
+    """)
+
+def _row_values(sample):
+    return (
+        sample.get('sample_id'),
+        sample.get('status'),
+        (sample.get('material_info') or {}).get('name'),
+        sample.get('request_date') or '',
+        json.dumps(sample),
+    )
+
+def load_legacy_samples():
+    # Unlike read_json_file, an unreadable file is an error here: treating it as empty would mark it migrated.
+    if not os.path.exists(SAMPLES_FILE):
+        return []
+    with open(SAMPLES_FILE, 'r', encoding='utf-8') as f:
+        samples = json.load(f)
+    if not isinstance(samples, list):
+        raise ValueError(f"expected a list of samples, found {type(samples).__name__}")
+    return samples
+
+def migrate_json_file(conn):
+    # One-shot import of the legacy samples.json; PRAGMA user_version marks it as done.
+    global migration_error
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        return
+    try:
+        samples = load_legacy_samples()
+    except (OSError, UnicodeDecodeError, ValueError) as e:
+        # json.JSONDecodeError is a ValueError. Left unmigrated (user_version untouched) so a repaired file is imported.
+        migration_error = f"{SAMPLES_FILE} could not be read, so its samples were not imported: {e}"
+        print(f"ERROR: {migration_error}. Repair the file; the import runs again on the next connection.")
+        return
+    migration_error = None
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+            skipped = 0
+            for sample in samples:
+                if not sample or not sample.get('sample_id'):
+                    skipped += 1
+                    continue
+                cur = conn.execute(
+                    "INSERT OR IGNORE INTO samples (sample_id, status, material, request_date, data) VALUES (?, ?, ?, ?, ?)",
+                    _row_values(sample)
+                )
+                skipped += 1 - cur.rowcount
+            conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+            if samples:
+                print(f"Migrated {len(samples) - skipped} samples from {SAMPLES_FILE} ({skipped} skipped as empty or duplicate).")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    if samples and os.path.exists(SAMPLES_FILE):
+        os.replace(SAMPLES_FILE, SAMPLES_FILE + '.migrated')
+
+def ensure_data_dir_exists():
+    if not os.path.exists(DATA_DIR):
+        os.makedirs(DATA_DIR)
+    conn = get_connection()
+    init_schema(conn)
+    migrate_json_file(conn)
+
+def read_json_file(file_path):
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return []
+
+def _ready_connection():
+    conn = get_connection()
+    if not getattr(_local, 'ready', False):
+        init_schema(conn)
+        migrate_json_file(conn)
+        _local.ready = True
+    return conn
+
+@metrics.timed("db.read.get_samples")
+def get_samples():
+    rows = _ready_connection().execute("SELECT data FROM samples ORDER BY rowid").fetchall()
+    return [json.loads(row[0]) for row in rows]
+
+@metrics.timed("db.read.get_sample")
+def get_sample(sample_id):
+    row = _ready_connection().execute("SELECT data FROM samples WHERE sample_id = ?", (sample_id,)).fetchone()
+    return json.loads(row[0]) if row else None
+
+def _record_change(conn, sample_id):
+    seq = conn.execute("INSERT INTO sample_changes (sample_id, changed_at) VALUES (?, ?)", (sample_id, time.time())).lastrowid
+    conn.execute("DELETE FROM sample_changes WHERE seq <= ?", (seq - CHANGE_LOG_KEEP,))
+    return seq
+
+def _notify_change(seq):
+    for listener in list(change_listeners):
+        listener(seq)
+
+@metrics.timed("db.write.save_sample")
+def save_sample(sample_data, make_id=None, attempts=20):
+    # With make_id, a sample_id that is already taken is replaced by make_id() and the save retried.
+    # Returns the sample_id the sample was saved under.
+    conn = _ready_connection()
+    for attempt in range(attempts):
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT INTO samples (sample_id, status, material, request_date, data) VALUES (?, ?, ?, ?, ?)",
+                _row_values(sample_data)
+            )
+            seq = _record_change(conn, sample_data.get('sample_id'))
+            conn.execute("COMMIT")
+        except sqlite3.IntegrityError:
+            conn.execute("ROLLBACK")
+            if make_id is None or attempt == attempts - 1:
+                raise
+            sample_data['sample_id'] = make_id()
+            continue
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        _notify_change(seq)
+        return sample_data['sample_id']
+
+@metrics.timed("db.write.update_sample")
+def update_sample(sample_id, updated_data):
+    conn = _ready_connection()
+    seq = None
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute("SELECT data FROM samples WHERE sample_id = ?", (sample_id,)).fetchone()
+        if row:
+            sample = json.loads(row[0])
+            sample.update(updated_data)
+            conn.execute(
+                "UPDATE samples SET status = ?, material = ?, request_date = ?, data = ? WHERE sample_id = ?",
+                _row_values(sample)[1:] + (sample_id,)
+            )
+            seq = _record_change(conn, sample_id)
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    if seq is not None:
+        _notify_change(seq)
+
+def get_change_seq():
+    # The store's version: bumps on every committed write from any process. A primary-key lookup, cheap to poll.
+    return _ready_connection().execute("SELECT COALESCE(MAX(seq), 0) FROM sample_changes").fetchone()[0]
+
+def get_changes_since(seq):
+    # (latest seq, ids of samples changed after `seq`), or (latest seq, None) if the log no longer reaches back that far.
+    conn = _ready_connection()
+    rows = conn.execute("SELECT seq, sample_id FROM sample_changes WHERE seq > ? ORDER BY seq", (seq,)).fetchall()
+    oldest = conn.execute("SELECT MIN(seq) FROM sample_changes").fetchone()[0]
+    latest = rows[-1][0] if rows else seq
+    if oldest is not None and oldest > seq + 1:
+        return latest, None
+    return latest, {row[1] for row in rows}
+
+def _date_bound(value, end_of_day=False):
+    if value is None:
+        return None
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    if isinstance(value, datetime.date):
+        if end_of_day:
+            value = value + datetime.timedelta(days=1)
+        return value.isoformat()
+    return str(value)
+
+def _where_clause(status=None, material=None, date_from=None, date_to=None):
+    clauses, params = [], []
+    if status is not None:
+        clauses.append("status = ?"); params.append(status)
+    if material is not None:
+        clauses.append("material = ?"); params.append(material)
+    if date_from is not None:
+        clauses.append("request_date >= ?"); params.append(_date_bound(date_from))
+    if date_to is not None:
+        # A plain date means "up to the end of that day".
+        op = "<" if isinstance(date_to, datetime.date) and not isinstance(date_to, datetime.datetime) else "<="
+        clauses.append(f"request_date {op} ?"); params.append(_date_bound(date_to, end_of_day=True))
+    return clauses, params
+
+@metrics.timed("db.read.query_samples")
+def query_samples(status=None, material=None, date_from=None, date_to=None, newest_first=False, cursor=None, limit=20):
+    # Keyset pagination: returns one page plus the cursor for the next one (None when exhausted).
+    clauses, params = _where_clause(status, material, date_from, date_to)
+    if cursor:
+        cursor_date, cursor_rowid = cursor.rsplit('|', 1)
+        clauses.append(f"(request_date, rowid) {'<' if newest_first else '>'} (?, ?)")
+        params.extend([cursor_date, int(cursor_rowid)])
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    direction = "DESC" if newest_first else "ASC"
+    rows = _ready_connection().execute(
+        f"SELECT rowid, request_date, data FROM samples {where} ORDER BY request_date {direction}, rowid {direction} LIMIT ?",
+        params + [limit + 1]
+    ).fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = f"{rows[-1][1]}|{rows[-1][0]}"
+    return [json.loads(row[2]) for row in rows], next_cursor
+
+@metrics.timed("db.read.count_samples")
+def count_samples(status=None, material=None, date_from=None, date_to=None):
+    clauses, params = _where_clause(status, material, date_from, date_to)
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    return _ready_connection().execute(f"SELECT COUNT(*) FROM samples {where}", params).fetchone()[0]
+
+@metrics.timed("db.read.get_material_names")
+def get_material_names(status=None):
+    clauses, params = _where_clause(status)
+    where = f"WHERE {' AND '.join(clauses)} AND material IS NOT NULL" if clauses else "WHERE material IS NOT NULL"
+    rows = _ready_connection().execute(f"SELECT DISTINCT material FROM samples {where} ORDER BY material", params).fetchall()
+    return [row[0] for row in rows]
+
+def get_request_months():
+    # Distinct "YYYY-MM" months that have samples, oldest first.
+    rows = _ready_connection().execute(
+        "SELECT DISTINCT substr(request_date, 1, 7) FROM samples WHERE request_date != '' ORDER BY 1"
+    ).fetchall()
+    return [row[0] for row in rows]
+
+def get_request_dates(sample_ids):
+    conn = _ready_connection()
+    sample_ids = list(sample_ids)
+    dates = {}
+    # SQLite caps the number of bound parameters per statement.
+    for start in range(0, len(sample_ids), 500):
+        chunk = sample_ids[start:start + 500]
+        rows = conn.execute(
+            f"SELECT sample_id, request_date FROM samples WHERE sample_id IN ({','.join('?' * len(chunk))})", chunk
+        ).fetchall()
+        dates.update(rows)
+    return dates
@@ -1,12 +1,35 @@
 #doc_parser
 
+import contextlib
+import hashlib
+import json
 import os
 import subprocess
 import sys
 import shutil
+import threading
+import time
+import uuid
+from functools import lru_cache
+from utils import metrics, mineru_server
 
 TEMP_INPUT_DIR = 'temp_mineru_input'
 TEMP_OUTPUT_DIR = 'temp_mineru_output'
+CACHE_INDEX_FILE = os.path.join(TEMP_OUTPUT_DIR, 'cache_index.json')
+# Held while the index is read, changed and written, by every process sharing the cache (app, job workers, bulk CLI).
+CACHE_INDEX_LOCK_FILE = CACHE_INDEX_FILE + '.lock'
+# Disk budget for converted documents, in MB. Least recently used entries are evicted past it.
+CACHE_MAX_BYTES = int(os.getenv("MINERU_CACHE_MAX_MB", "2048")) * 1024 * 1024
+# Uploads are copied to disk this many bytes at a time, so memory use doesn't grow with the document.
+UPLOAD_CHUNK_BYTES = 1024 * 1024
+# Largest single document, and largest total a session may have uploaded at once, in MB.
+UPLOAD_MAX_BYTES = int(os.getenv("UPLOAD_MAX_MB", "200")) * 1024 * 1024
+SESSION_UPLOAD_MAX_BYTES = int(os.getenv("SESSION_UPLOAD_MAX_MB", "500")) * 1024 * 1024
+
+index_lock = threading.Lock()
+
+class UploadTooLarge(Exception):
+    pass
 
 def get_mineru_executable_path():
     scripts_dir = os.path.dirname(sys.executable)
@@ -22,43 +45,224 @@ def get_mineru_executable_path():
         
     return executable_path
 
-def get_md_from_file_mineru(uploaded_file):
-    if uploaded_file is None:
-        return "Error: No file was uploaded."
-    base_name = os.path.splitext(uploaded_file.name)[0]
-    md_file_path = os.path.join(TEMP_OUTPUT_DIR, base_name, "auto", f"{base_name}.md")
+@lru_cache(maxsize=1)
+def get_mineru_version():
+    mineru_exe = get_mineru_executable_path()
+    if not mineru_exe:
+        return "unknown"
+    try:
+        result = subprocess.run([mineru_exe, "--version"], capture_output=True, text=True, encoding='utf-8', timeout=60)
+        return (result.stdout or result.stderr).strip() or "unknown"
+    except Exception:
+        return "unknown"
 
-    if os.path.exists(md_file_path):
-        print(f"CACHE HIT: Using existing Markdown file: {md_file_path}")
-        with open(md_file_path, "r", encoding="utf-8") as f:
-            return f.read()
+@contextlib.contextmanager
+def cache_index_lock():
+    # The thread lock covers this process; the lock file covers the others, and is released if a process dies.
+    with index_lock:
+        os.makedirs(TEMP_OUTPUT_DIR, exist_ok=True)
+        with open(CACHE_INDEX_LOCK_FILE, 'a+b') as lock_file:
+            if sys.platform == "win32":
+                import msvcrt
+                lock_file.seek(0)
+                while True:
+                    try:
+                        msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        # LK_LOCK gives up after about ten seconds; keep waiting.
+                        pass
+                try:
+                    yield
+                finally:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                import fcntl
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+                try:
+                    yield
+                finally:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
 
-    print(f"CACHE MISS: Processing file with Mineru: {uploaded_file.name}")
+def load_cache_index():
+    try:
+        with open(CACHE_INDEX_FILE, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
 
-    mineru_exe = get_mineru_executable_path()
-    if not mineru_exe:
-        return "Error: Could not locate the Mineru executable. Please check your installation."
+def save_cache_index(index):
+    os.makedirs(TEMP_OUTPUT_DIR, exist_ok=True)
+    tmp_path = f"{CACHE_INDEX_FILE}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(index, f)
+    os.replace(tmp_path, CACHE_INDEX_FILE)
+
+def get_cache_md_path(file_hash):
+    # Mineru writes <output>/<input stem>/auto/<input stem>.md, and the input is saved as <hash><ext>.
+    return os.path.join(TEMP_OUTPUT_DIR, file_hash, "auto", f"{file_hash}.md")
+
+def get_dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+def evict_cache_entries(index, keep=None):
+    total = sum(entry.get('size', 0) for entry in index.values())
+    for file_hash, entry in sorted(index.items(), key=lambda item: item[1].get('last_access', 0)):
+        if total <= CACHE_MAX_BYTES:
+            break
+        if file_hash == keep:
+            continue
+        shutil.rmtree(os.path.join(TEMP_OUTPUT_DIR, file_hash), ignore_errors=True)
+        total -= entry.get('size', 0)
+        del index[file_hash]
+        print(f"CACHE EVICT: {file_hash} ({entry.get('name')})")
 
-    temp_input_path = os.path.join(TEMP_INPUT_DIR, uploaded_file.name)
-    os.makedirs(TEMP_INPUT_DIR, exist_ok=True)
-    with open(temp_input_path, "wb") as f:
-        f.write(uploaded_file.getvalue())
+def lookup_cached_md_path(file_hash):
+    md_file_path = get_cache_md_path(file_hash)
+    mineru_version = get_mineru_version()
+    with cache_index_lock():
+        index = load_cache_index()
+        entry = index.get(file_hash)
+        if not entry or entry.get('mineru_version') != mineru_version or not os.path.exists(md_file_path):
+            metrics.count("cache_requests", cache="mineru", result="miss")
+            return None
+        entry['last_access'] = time.time()
+        save_cache_index(index)
+    metrics.count("cache_requests", cache="mineru", result="hit")
+    return md_file_path
 
-    temp_output_path = os.path.join(TEMP_OUTPUT_DIR)
+def read_md(md_file_path):
+    with open(md_file_path, "r", encoding="utf-8") as f:
+        return f.read()
 
+def lookup_cached_md(file_hash):
+    md_file_path = lookup_cached_md_path(file_hash)
+    return None if md_file_path is None else read_md(md_file_path)
+
+def record_cached_md(file_hash, file_name):
+    entry = {
+        'name': file_name,
+        'size': get_dir_size(os.path.join(TEMP_OUTPUT_DIR, file_hash)),
+        'last_access': time.time(),
+        'mineru_version': get_mineru_version(),
+    }
+    with cache_index_lock():
+        index = load_cache_index()
+        index[file_hash] = entry
+        evict_cache_entries(index, keep=file_hash)
+        save_cache_index(index)
+
+def get_upload_size(uploaded_file):
+    path = getattr(uploaded_file, 'path', None)
+    return os.path.getsize(path) if path else uploaded_file.size
+
+def check_upload_sizes(files, max_total_bytes=None, max_file_bytes=None):
+    # Returns an error message, or None when the files fit the per-document and per-session limits.
+    max_total_bytes = max_total_bytes or SESSION_UPLOAD_MAX_BYTES
+    max_file_bytes = max_file_bytes or UPLOAD_MAX_BYTES
+    total = 0
+    for uploaded_file in files:
+        size = get_upload_size(uploaded_file)
+        if size > max_file_bytes:
+            return (f"Error: '{uploaded_file.name}' is {size / (1024 * 1024):.0f} MB, over the "
+                    f"{max_file_bytes // (1024 * 1024)} MB limit per document (UPLOAD_MAX_MB).")
+        total += size
+    if total > max_total_bytes:
+        return (f"Error: These uploads total {total / (1024 * 1024):.0f} MB, over the {max_total_bytes // (1024 * 1024)} MB "
+                f"limit per session (SESSION_UPLOAD_MAX_MB). Please upload fewer documents at a time.")
+    return None
+
+def iter_upload_chunks(uploaded_file, chunk_size=UPLOAD_CHUNK_BYTES):
+    # Files on disk are read from their path; Streamlit's UploadedFile is file-like. getvalue() would copy it whole.
+    path = getattr(uploaded_file, 'path', None)
+    source = open(path, 'rb') if path else uploaded_file
     try:
-        command = [mineru_exe, "-p", temp_input_path, "-o", temp_output_path]
+        source.seek(0)
+        while True:
+            chunk = source.read(chunk_size)
+            if not chunk:
+                break
+            yield chunk
+    finally:
+        if path:
+            source.close()
+        else:
+            source.seek(0)
+
+def compute_file_hash(uploaded_file):
+    digest = hashlib.sha256()
+    for chunk in iter_upload_chunks(uploaded_file):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+def save_upload(uploaded_file, directory, max_bytes=None, suffix=""):
+    # Streams the upload to <directory>/<sha256><suffix><ext>, hashing it in the same pass. Returns (file_hash, path).
+    max_bytes = max_bytes or UPLOAD_MAX_BYTES
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = os.path.join(directory, f".upload-{uuid.uuid4().hex}.tmp")
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with open(tmp_path, "wb") as f:
+            for chunk in iter_upload_chunks(uploaded_file):
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(
+                        f"'{uploaded_file.name}' is over the {max_bytes // (1024 * 1024)} MB limit per document (UPLOAD_MAX_MB)."
+                    )
+                digest.update(chunk)
+                f.write(chunk)
+        file_hash = digest.hexdigest()
+        path = os.path.join(directory, f"{file_hash}{suffix}{os.path.splitext(uploaded_file.name)[1]}")
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return file_hash, path
+
+def run_mineru(mineru_exe, input_path, output_path=TEMP_OUTPUT_DIR):
+    # input_path may be a single file or a directory of files; Mineru converts them all in one process.
+    # The pre-warmed worker is tried first; the CLI remains the fallback.
+    if mineru_server.WORKER_ENABLED and mineru_server.worker_supports(input_path):
+        try:
+            with metrics.span("mineru.worker") as attrs:
+                try:
+                    error_message = mineru_server.convert_with_worker(input_path, output_path)
+                except mineru_server.WorkerBusy as e:
+                    # Not a failure: the worker has another document, so this one runs on the CLI alongside it.
+                    attrs["busy"] = True
+                    error_message = f"{e}"
+                else:
+                    attrs["ok"] = error_message is None
+            if error_message is None:
+                print("Mineru worker processing completed successfully.")
+                return None
+            print(f"{error_message}\nFalling back to the Mineru CLI.")
+        except mineru_server.WorkerUnavailable as e:
+            print(f"{e} Falling back to the Mineru CLI.")
+    try:
+        command = [mineru_exe, "-p", input_path, "-o", output_path]
         
-        result = subprocess.run(
-            command, 
-            check=True, 
-            capture_output=True, 
-            text=True, 
-            encoding='utf-8'
-        )
+        with metrics.span("mineru.cli"):
+            result = subprocess.run(
+                command, 
+                check=True, 
+                capture_output=True, 
+                text=True, 
+                encoding='utf-8'
+            )
         print("Mineru stdout:", result.stdout)
         print("Mineru stderr:", result.stderr)
         print("Mineru processing completed successfully.")
+        return None
 
     except subprocess.CalledProcessError as e:
         error_message = f"Mineru failed to process the file.\nCommand: {' '.join(command)}\nError: {e.stderr}"
@@ -67,9 +271,44 @@ def get_md_from_file_mineru(uploaded_file):
     except Exception as e:
         return f"An unexpected error occurred while running Mineru: {e}"
 
+def get_md_from_file_mineru(uploaded_file):
+    if uploaded_file is None:
+        return "Error: No file was uploaded."
+    if get_upload_size(uploaded_file) > UPLOAD_MAX_BYTES:
+        return f"Error: '{uploaded_file.name}' is over the {UPLOAD_MAX_BYTES // (1024 * 1024)} MB limit per document (UPLOAD_MAX_MB)."
+    # Hashed without writing anything: a cached document never touches the input directory.
+    file_hash = compute_file_hash(uploaded_file)
+    md_file_path = get_cache_md_path(file_hash)
+
+    cached_md = lookup_cached_md(file_hash)
+    if cached_md is not None:
+        print(f"CACHE HIT: Using existing Markdown file: {md_file_path}")
+        return cached_md
+
+    print(f"CACHE MISS: Processing file with Mineru: {uploaded_file.name}")
+
+    mineru_exe = get_mineru_executable_path()
+    if not mineru_exe:
+        return "Error: Could not locate the Mineru executable. Please check your installation."
+
+    try:
+        # Written under the hash save_upload computes while streaming; it matches file_hash unless the file changed.
+        file_hash, temp_input_path = save_upload(uploaded_file, TEMP_INPUT_DIR)
+    except UploadTooLarge as e:
+        return f"Error: {e}"
+    md_file_path = get_cache_md_path(file_hash)
+
+    try:
+        error_message = run_mineru(mineru_exe, temp_input_path)
+    finally:
+        if os.path.exists(temp_input_path):
+            os.remove(temp_input_path)
+    if error_message:
+        return error_message
+
     # After processing, read the newly created file
     if os.path.exists(md_file_path):
-        with open(md_file_path, "r", encoding="utf-8") as f:
-            return f.read()
+        record_cached_md(file_hash, uploaded_file.name)
+        return read_md(md_file_path)
     else:
         return f"Error: Mineru ran, but the output file was not found at {md_file_path}."
\ No newline at end of file
@@ -0,0 +1,235 @@
+#gemini_client
+
+import asyncio
+import hashlib
+import os
+import random
+import sqlite3
+import threading
+import time
+
+from utils import metrics
+
+MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "4"))
+# The quota for the whole host: every process using RATE_LIMIT_FILE (server, job workers, bulk CLI) shares it.
+REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "30"))
+RATE_LIMIT_FILE = os.getenv("GEMINI_RATE_LIMIT_FILE", os.path.join('data', 'gemini_rate_limit.db'))
+TIMEOUT_SECONDS = float(os.getenv("GEMINI_TIMEOUT_SECONDS", "60"))
+MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "4"))
+RETRY_BASE_DELAY = float(os.getenv("GEMINI_RETRY_BASE_DELAY", "1.0"))
+RETRY_MAX_DELAY = 30.0
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class TokenBucket:
+    # Allows `burst` calls at once, refilling at `rate_per_minute`.
+    def __init__(self, rate_per_minute, burst=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst or max(1.0, self.rate * 10)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class SharedTokenBucket(TokenBucket):
+    # The same bucket kept in SQLite, so separate processes draw from one quota instead of one each.
+    def __init__(self, path, rate_per_minute, burst=None, name="gemini"):
+        super().__init__(rate_per_minute, burst)
+        self.path = path
+        self.name = name
+        self.local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("CREATE TABLE IF NOT EXISTS buckets (name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)")
+            self.local.conn = conn
+        return conn
+
+    def _take(self):
+        # Takes a token if one is available; returns how many seconds to wait before trying again (0 when taken).
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute("SELECT tokens, updated FROM buckets WHERE name = ?", (self.name,)).fetchone()
+            tokens = self.capacity if row is None else min(self.capacity, row[0] + max(0.0, now - row[1]) * self.rate)
+            wait = 0.0 if tokens >= 1 else (1 - tokens) / self.rate
+            if not wait:
+                tokens -= 1
+            conn.execute("INSERT OR REPLACE INTO buckets (name, tokens, updated) VALUES (?, ?, ?)", (self.name, tokens, now))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return wait
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                wait = await asyncio.to_thread(self._take)
+                if not wait:
+                    return
+                await asyncio.sleep(wait)
+
+def is_retryable(error):
+    if isinstance(error, asyncio.TimeoutError):
+        return True
+    code = getattr(error, 'code', None)
+    try:
+        return int(code) in RETRYABLE_STATUS_CODES
+    except (TypeError, ValueError):
+        return False
+
+def record_usage(attrs, response):
+    # Token counts as reported by the API; a stream reports them on its last chunk.
+    usage = getattr(response, 'usage_metadata', None)
+    if usage is not None:
+        attrs["prompt_tokens"] = getattr(usage, 'prompt_token_count', None)
+        attrs["response_tokens"] = getattr(usage, 'candidates_token_count', None)
+
+def join_stream(generate_content, prompt, attrs):
+    chunks = []
+    for chunk in generate_content(prompt, stream=True):
+        chunks.append(chunk.text)
+        record_usage(attrs, chunk)
+    return "".join(chunks)
+
+class GeminiClient:
+    # Async wrapper around a genai.GenerativeModel (or any object with generate_content/generate_content_async).
+    def __init__(self, model, max_concurrency=MAX_CONCURRENCY, requests_per_minute=REQUESTS_PER_MINUTE,
+                 timeout=TIMEOUT_SECONDS, max_retries=MAX_RETRIES, retry_base_delay=RETRY_BASE_DELAY, rate_limit_file=None):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self.requests_per_minute = requests_per_minute
+        # With a rate limit file the quota is shared with other processes; without one it is per client.
+        self.rate_limit_file = rate_limit_file
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.loop = None
+        self.loop_lock = threading.Lock()
+
+    def _ensure_loop(self):
+        # All calls run on one background event loop so the semaphore, rate limiter
+        # and in-flight table are shared by every Streamlit session in the process.
+        with self.loop_lock:
+            if self.loop is None:
+                self.loop = asyncio.new_event_loop()
+                threading.Thread(target=self.loop.run_forever, name="gemini-client", daemon=True).start()
+                future = asyncio.run_coroutine_threadsafe(self._init_primitives(), self.loop)
+                future.result()
+        return self.loop
+
+    async def _init_primitives(self):
+        self.semaphore = asyncio.Semaphore(self.max_concurrency)
+        if self.rate_limit_file:
+            self.bucket = SharedTokenBucket(self.rate_limit_file, self.requests_per_minute)
+        else:
+            self.bucket = TokenBucket(self.requests_per_minute)
+        self.in_flight = {}
+
+    async def _call_model(self, prompt, stream=False, attrs=None):
+        attrs = {} if attrs is None else attrs
+        if not stream:
+            if hasattr(self.model, 'generate_content_async'):
+                response = await self.model.generate_content_async(prompt)
+            else:
+                response = await asyncio.to_thread(self.model.generate_content, prompt)
+            record_usage(attrs, response)
+            return response.text
+        # Streaming starts receiving output as soon as the model produces it, and the deadline covers the whole stream.
+        if hasattr(self.model, 'generate_content_async'):
+            response = await self.model.generate_content_async(prompt, stream=True)
+            chunks = []
+            async for chunk in response:
+                chunks.append(chunk.text)
+                record_usage(attrs, chunk)
+            return "".join(chunks)
+        return await asyncio.to_thread(join_stream, self.model.generate_content, prompt, attrs)
+
+    async def _generate_with_retries(self, prompt, stream=False):
+        attempt = 0
+        with metrics.span("gemini.call", stream=stream, prompt_chars=len(prompt)) as attrs:
+            while True:
+                await self.bucket.acquire()
+                try:
+                    async with self.semaphore:
+                        text = await asyncio.wait_for(self._call_model(prompt, stream, attrs), timeout=self.timeout)
+                    attrs.update(attempts=attempt + 1, response_chars=len(text))
+                    return text
+                except Exception as e:
+                    if attempt >= self.max_retries or not is_retryable(e):
+                        attrs.update(attempts=attempt + 1, error=type(e).__name__)
+                        raise
+                    # Exponential backoff with full jitter.
+                    delay = min(RETRY_MAX_DELAY, self.retry_base_delay * (2 ** attempt))
+                    attempt += 1
+                    metrics.count("gemini_retries", reason=type(e).__name__)
+                    print(f"Gemini call failed ({e!r}); retry {attempt}/{self.max_retries}.")
+                    await asyncio.sleep(random.uniform(0, delay))
+
+    async def generate_async(self, prompt, stream=False):
+        # Identical prompts already in flight share a single API call.
+        key = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+        task = self.in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._generate_with_retries(prompt, stream))
+            self.in_flight[key] = task
+            task.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    async def generate_many_async(self, prompts, stream=False):
+        return await asyncio.gather(*(self.generate_async(prompt, stream) for prompt in prompts), return_exceptions=True)
+
+    def generate(self, prompt, stream=False):
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(self.generate_async(prompt, stream), loop).result()
+
+    def generate_many(self, prompts, stream=False):
+        # Returns one entry per prompt: the response text, or the exception that call raised.
+        loop = self._ensure_loop()
+        return asyncio.run_coroutine_threadsafe(self.generate_many_async(prompts, stream), loop).result()
+
+class FakeResponse:
+    def __init__(self, text):
+        self.text = text
+
+class FakeModel:
+    # Local stand-in for genai.GenerativeModel: `responder(prompt)` returns the text or raises.
+    def __init__(self, responder, latency=0.0):
+        self.responder = responder
+        self.latency = latency
+        self.calls = 0
+
+    async def generate_content_async(self, prompt, stream=False):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        text = self.responder(prompt)
+        if stream:
+            return FakeStream(text)
+        return FakeResponse(text)
+
+class FakeStream:
+    def __init__(self, text, chunk_size=64):
+        self.chunks = [FakeResponse(text[i:i + chunk_size]) for i in range(0, len(text), chunk_size)]
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for chunk in self.chunks:
+            yield chunk
@@ -0,0 +1,349 @@
+#jobs
+
+import argparse
+import json
+import multiprocessing
+import os
+import sqlite3
+import subprocess
+import sys
+import threading
+import time
+import traceback
+import uuid
+
+from utils import ai_processing, doc_parser
+from utils.bulk_ingest import LocalFile
+from utils.doc_parser import TEMP_INPUT_DIR, get_md_from_file_mineru, save_upload
+
+JOBS_DIR = 'data'
+JOBS_FILE = os.path.join(JOBS_DIR, 'jobs.db')
+JOB_UPLOAD_DIR = os.path.join(TEMP_INPUT_DIR, 'jobs')
+NUM_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+POLL_INTERVAL = 0.5
+# How often the worker supervisor checks on its workers and on the process that started it.
+SUPERVISE_INTERVAL = 2
+# A queued job older than this with no live worker is reported to the user.
+QUEUED_WARNING_SECONDS = 10
+# A running job is handed back to the queue as soon as its worker process is gone, or after this long regardless.
+STALE_JOB_SECONDS = float(os.getenv("JOB_STALE_SECONDS", "1800"))
+# A job handed back that many times is failed instead: the document is probably what kills the worker.
+MAX_JOB_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+_local = threading.local()
+workers_lock = threading.Lock()
+supervisor = {"process": None}
+
+class JobError(Exception):
+    pass
+
+def get_connection():
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        os.makedirs(JOBS_DIR, exist_ok=True)
+        conn = sqlite3.connect(JOBS_FILE, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                dedupe_key TEXT,
+                payload TEXT NOT NULL,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                worker_pid INTEGER,
+                attempts INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        existing = [column[1] for column in conn.execute("PRAGMA table_info(jobs)")]
+        for column, definition in (("worker_pid", "INTEGER"), ("attempts", "INTEGER NOT NULL DEFAULT 0")):
+            if column not in existing:
+                # Job stores created before the column existed; another process may be adding it at the same time.
+                try:
+                    conn.execute(f"ALTER TABLE jobs ADD COLUMN {column} {definition}")
+                except sqlite3.OperationalError:
+                    pass
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs(status, created_at)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_dedupe ON jobs(dedupe_key)")
+        # Worker processes register here, wherever they were started from, so the app can tell whether any are running.
+        conn.execute("CREATE TABLE IF NOT EXISTS workers (pid INTEGER PRIMARY KEY, started_at REAL NOT NULL)")
+        _local.conn = conn
+    return conn
+
+def _row_to_job(row):
+    if row is None:
+        return None
+    job_id, kind, status, payload, result, error, created_at, started_at, finished_at = row
+    return {
+        "job_id": job_id, "kind": kind, "status": status,
+        "payload": json.loads(payload), "result": json.loads(result) if result else None, "error": error,
+        "created_at": created_at, "started_at": started_at, "finished_at": finished_at,
+    }
+
+JOB_COLUMNS = "job_id, kind, status, payload, result, error, created_at, started_at, finished_at"
+
+def get_job(job_id):
+    row = get_connection().execute(f"SELECT {JOB_COLUMNS} FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+    return _row_to_job(row)
+
+def submit_job(kind, payload, dedupe_key=None):
+    # A job with the same dedupe key that is still queued or running is joined instead of starting another.
+    # Finished jobs are never reused: repeat work is served by the LLM and Mineru caches, which honour their
+    # TTLs, invalidation and Mineru version, and don't keep incomplete results.
+    conn = get_connection()
+    if dedupe_key:
+        row = conn.execute(
+            "SELECT job_id FROM jobs WHERE dedupe_key = ? AND status IN (?, ?) ORDER BY created_at DESC LIMIT 1",
+            (dedupe_key, QUEUED, RUNNING)
+        ).fetchone()
+        if row:
+            return row[0]
+    job_id = uuid.uuid4().hex
+    conn.execute(
+        "INSERT INTO jobs (job_id, kind, status, dedupe_key, payload, created_at) VALUES (?, ?, ?, ?, ?, ?)",
+        (job_id, kind, QUEUED, dedupe_key, json.dumps(payload), time.time())
+    )
+    return job_id
+
+def submit_document(uploaded_file, kind="process_document"):
+    # Uploads are saved to disk so the job survives reruns and can be picked up by any worker. Each submission
+    # gets its own file, deleted when its job finishes. Streamed in chunks; raises doc_parser.UploadTooLarge past UPLOAD_MAX_MB.
+    file_hash, path = save_upload(uploaded_file, JOB_UPLOAD_DIR, suffix=f"-{uuid.uuid4().hex}")
+    payload = {"path": path, "name": uploaded_file.name}
+    job_id = submit_job(kind, payload, dedupe_key=f"{kind}:{file_hash}:{ai_processing.SPEC_PROMPT_VERSION}")
+    if get_job(job_id)['payload'].get('path') != path:
+        # Joined a job already queued or running for the same document, which has its own copy.
+        os.remove(path)
+    return job_id
+
+def process_document_from_cache(uploaded_file):
+    # What a process_document job would return, when the Mineru and LLM caches already hold all of it; None otherwise.
+    # Lets the page skip the queue (and its polling delay) for a document it has seen before.
+    if doc_parser.get_upload_size(uploaded_file) > doc_parser.UPLOAD_MAX_BYTES:
+        return None
+    markdown_content = doc_parser.lookup_cached_md(doc_parser.compute_file_hash(uploaded_file))
+    if markdown_content is None:
+        return None
+    specs = ai_processing.get_cached_specs(markdown_content)
+    summary = ai_processing.get_cached_summary(markdown_content) if specs is not None else None
+    if summary is None:
+        return None
+    return {"specs": specs, "summary": summary}
+
+def claim_next_job():
+    requeue_stale_jobs()
+    conn = get_connection()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        row = conn.execute(
+            "SELECT job_id FROM jobs WHERE status = ? ORDER BY created_at LIMIT 1", (QUEUED,)
+        ).fetchone()
+        if row:
+            conn.execute(
+                "UPDATE jobs SET status = ?, started_at = ?, worker_pid = ?, attempts = attempts + 1 WHERE job_id = ?",
+                (RUNNING, time.time(), os.getpid(), row[0])
+            )
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+    return get_job(row[0]) if row else None
+
+def finish_job(job_id, result=None, error=None):
+    get_connection().execute(
+        "UPDATE jobs SET status = ?, result = ?, error = ?, finished_at = ? WHERE job_id = ?",
+        (FAILED if error else DONE, None if error else json.dumps(result), error, time.time(), job_id)
+    )
+
+def process_alive(pid):
+    if sys.platform == "win32":
+        import ctypes
+        kernel32 = ctypes.windll.kernel32
+        # PROCESS_QUERY_LIMITED_INFORMATION; exit code 259 is STILL_ACTIVE.
+        handle = kernel32.OpenProcess(0x1000, False, pid)
+        if not handle:
+            return False
+        exit_code = ctypes.c_ulong()
+        kernel32.GetExitCodeProcess(handle, ctypes.byref(exit_code))
+        kernel32.CloseHandle(handle)
+        return exit_code.value == 259
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+def requeue_stale_jobs():
+    # Running jobs whose worker has exited (or that have run past STALE_JOB_SECONDS) go back to the queue,
+    # or are failed once they have been tried MAX_JOB_ATTEMPTS times.
+    conn = get_connection()
+    cutoff = time.time() - STALE_JOB_SECONDS
+    rows = conn.execute("SELECT job_id, worker_pid, started_at, attempts FROM jobs WHERE status = ?", (RUNNING,)).fetchall()
+    for job_id, worker_pid, started_at, attempts in rows:
+        if worker_pid is not None and process_alive(worker_pid) and (started_at or 0) >= cutoff:
+            continue
+        # Only if it is still the same run, in case the worker finished it meanwhile.
+        if attempts >= MAX_JOB_ATTEMPTS:
+            conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, finished_at = ? WHERE job_id = ? AND status = ? AND started_at IS ?",
+                (FAILED, f"The job was tried {attempts} times and each time its worker exited or it ran past "
+                         f"{STALE_JOB_SECONDS:.0f} seconds; the document may be crashing the worker (e.g. running out of memory).",
+                 time.time(), job_id, RUNNING, started_at)
+            )
+            print(f"Failed job {job_id} after {attempts} attempts: worker {worker_pid} is gone or the job ran too long.")
+        else:
+            conn.execute(
+                "UPDATE jobs SET status = ?, started_at = NULL, worker_pid = NULL WHERE job_id = ? AND status = ? AND started_at IS ?",
+                (QUEUED, job_id, RUNNING, started_at)
+            )
+            print(f"Requeued job {job_id} (attempt {attempts} of {MAX_JOB_ATTEMPTS}): worker {worker_pid} is gone or the job ran too long.")
+
+def _load_document(payload):
+    uploaded_file = LocalFile(payload['path'])
+    uploaded_file.name = payload['name']
+    return uploaded_file
+
+def handle_convert_document(payload):
+    markdown_content = get_md_from_file_mineru(_load_document(payload))
+    if "Error" in markdown_content:
+        raise JobError(markdown_content)
+    return {"markdown": markdown_content}
+
+def handle_extract_specs(payload):
+    success, result = ai_processing.extract_specs_from_text(payload['markdown'])
+    if not success:
+        raise JobError(result)
+    return result
+
+def handle_process_document(payload):
+    markdown_content = handle_convert_document(payload)["markdown"]
+    specs = handle_extract_specs({"markdown": markdown_content})
+    return {"specs": specs, "summary": ai_processing.summarize_document_context(markdown_content)}
+
+def handle_validate(payload):
+    final_decision, results_breakdown = ai_processing.validate_qc_results(
+        payload['specifications'], payload['qc_results'], material=payload.get('material')
+    )
+    return {"decision": final_decision, "breakdown": results_breakdown}
+
+HANDLERS = {
+    "convert_document": handle_convert_document,
+    "extract_specs": handle_extract_specs,
+    "process_document": handle_process_document,
+    "validate": handle_validate,
+}
+
+def remove_job_upload(payload):
+    path = payload.get('path')
+    if path and os.path.dirname(os.path.abspath(path)) == os.path.abspath(JOB_UPLOAD_DIR) and os.path.exists(path):
+        os.remove(path)
+
+def remove_orphan_uploads():
+    # Uploads left behind by jobs that never finished (e.g. the store was deleted); kept while any live job refers to them.
+    if not os.path.isdir(JOB_UPLOAD_DIR):
+        return
+    rows = get_connection().execute("SELECT payload FROM jobs WHERE status IN (?, ?)", (QUEUED, RUNNING)).fetchall()
+    live = {os.path.abspath(json.loads(payload).get('path') or '') for (payload,) in rows}
+    cutoff = time.time() - STALE_JOB_SECONDS
+    for name in os.listdir(JOB_UPLOAD_DIR):
+        path = os.path.abspath(os.path.join(JOB_UPLOAD_DIR, name))
+        try:
+            if path not in live and os.path.getmtime(path) < cutoff:
+                os.remove(path)
+        except OSError:
+            pass
+
+def run_job(job):
+    try:
+        result = HANDLERS[job['kind']](job['payload'])
+        finish_job(job['job_id'], result=result)
+    except JobError as e:
+        finish_job(job['job_id'], error=str(e))
+    except Exception:
+        finish_job(job['job_id'], error=traceback.format_exc())
+    finally:
+        # Converted documents live on in the Mineru cache, which has its own disk budget.
+        remove_job_upload(job['payload'])
+
+def worker_loop(stop_event=None):
+    print(f"Job worker {os.getpid()} started.")
+    conn = get_connection()
+    conn.execute("INSERT OR REPLACE INTO workers (pid, started_at) VALUES (?, ?)", (os.getpid(), time.time()))
+    try:
+        while stop_event is None or not stop_event.is_set():
+            job = claim_next_job()
+            if job is None:
+                time.sleep(POLL_INTERVAL)
+                continue
+            print(f"Job worker {os.getpid()} running {job['kind']} job {job['job_id']}.")
+            run_job(job)
+    finally:
+        conn.execute("DELETE FROM workers WHERE pid = ?", (os.getpid(),))
+
+def live_worker_count():
+    # Workers that exited without unregistering (killed, crashed) are dropped here.
+    conn = get_connection()
+    pids = [pid for (pid,) in conn.execute("SELECT pid FROM workers").fetchall()]
+    dead = [pid for pid in pids if not process_alive(pid)]
+    for pid in dead:
+        conn.execute("DELETE FROM workers WHERE pid = ?", (pid,))
+    return len(pids) - len(dead)
+
+def stuck_in_queue(job):
+    # True when a job has waited past QUEUED_WARNING_SECONDS and no worker is running to pick it up.
+    return (job['status'] == QUEUED and time.time() - job['created_at'] > QUEUED_WARNING_SECONDS
+            and live_worker_count() == 0)
+
+def ensure_workers(num_workers=NUM_WORKERS):
+    # Starts (or restarts) the worker supervisor once per server process; cheap to call on every rerun.
+    # A separate interpreter rather than multiprocessing: under Streamlit, __main__ is the page script,
+    # which spawned children would re-run on import.
+    with workers_lock:
+        requeue_stale_jobs()
+        process = supervisor["process"]
+        if process is not None and process.poll() is None:
+            return
+        if process is not None:
+            print(f"Job worker supervisor exited with code {process.returncode}; restarting it.")
+        remove_orphan_uploads()
+        # Same working directory as the app, so data/ resolves to the same job store; the project root goes on the path.
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [root, os.environ.get("PYTHONPATH")])))
+        supervisor["process"] = subprocess.Popen(
+            [sys.executable, "-m", "utils.jobs", "--workers", str(num_workers), "--parent-pid", str(os.getpid())], env=env
+        )
+
+def main():
+    parser = argparse.ArgumentParser(description="Run background job workers outside the Streamlit server.")
+    parser.add_argument("--workers", type=int, default=NUM_WORKERS)
+    parser.add_argument("--parent-pid", type=int, help="Exit when this process (the app that started the workers) exits.")
+    args = parser.parse_args()
+    requeue_stale_jobs()
+    remove_orphan_uploads()
+    context = multiprocessing.get_context("spawn")
+    processes = [None] * args.workers
+    try:
+        while args.parent_pid is None or process_alive(args.parent_pid):
+            for i, process in enumerate(processes):
+                if process is None or not process.is_alive():
+                    if process is not None:
+                        print(f"Job worker {process.pid} exited with code {process.exitcode}; starting a replacement.")
+                    processes[i] = context.Process(target=worker_loop, name="qc-job-worker")
+                    processes[i].start()
+            time.sleep(SUPERVISE_INTERVAL)
+    finally:
+        for process in processes:
+            if process is not None and process.is_alive():
+                process.terminate()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+#llm_cache
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from utils import metrics
+
+CACHE_DIR = 'data'
+CACHE_FILE = os.path.join(CACHE_DIR, 'llm_cache.db')
+CACHE_TTL_SECONDS = float(os.getenv("LLM_CACHE_TTL_DAYS", "30")) * 24 * 3600
+CACHE_MAX_ENTRIES = int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+
+_local = threading.local()
+stats_lock = threading.Lock()
+stats = {}
+
+def get_connection():
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        conn = sqlite3.connect(CACHE_FILE, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        _create_tables(conn)
+        _local.conn = conn
+    return conn
+
+ENTRIES_TABLE = """
+    CREATE TABLE IF NOT EXISTS entries (
+        namespace TEXT NOT NULL,
+        key TEXT NOT NULL,
+        value TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        last_access REAL NOT NULL,
+        PRIMARY KEY (namespace, key)
+    )
+"""
+
+def _create_tables(conn):
+    # Keys are only unique within a namespace: different prompts over the same document share a key.
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        columns = {column[1]: column[5] for column in conn.execute("PRAGMA table_info(entries)")}
+        if columns and not columns.get("namespace"):
+            # Caches from before keys were scoped by namespace: key alone was the primary key.
+            conn.execute("ALTER TABLE entries RENAME TO entries_unscoped")
+            conn.execute(ENTRIES_TABLE)
+            conn.execute(
+                "INSERT OR IGNORE INTO entries (namespace, key, value, created_at, last_access) "
+                "SELECT namespace, key, value, created_at, last_access FROM entries_unscoped"
+            )
+            conn.execute("DROP TABLE entries_unscoped")
+        conn.execute(ENTRIES_TABLE)
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries(last_access)")
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+def normalize_markdown(text):
+    # Whitespace-only differences between conversions shouldn't produce a different key.
+    lines = [line.rstrip() for line in text.strip().splitlines()]
+    return "\n".join(line for i, line in enumerate(lines) if line or (i > 0 and lines[i - 1]))
+
+def make_key(*parts):
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+def _count(namespace, field):
+    with stats_lock:
+        counters = stats.setdefault(namespace, {"hits": 0, "misses": 0})
+        counters[field] += 1
+    metrics.count("cache_requests", cache="llm", namespace=namespace, result="hit" if field == "hits" else "miss")
+
+def get(namespace, key):
+    conn = get_connection()
+    row = conn.execute("SELECT value, created_at FROM entries WHERE namespace = ? AND key = ?", (namespace, key)).fetchone()
+    now = time.time()
+    if row is None or now - row[1] > CACHE_TTL_SECONDS:
+        if row is not None:
+            conn.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+        _count(namespace, "misses")
+        return None
+    conn.execute("UPDATE entries SET last_access = ? WHERE namespace = ? AND key = ?", (now, namespace, key))
+    _count(namespace, "hits")
+    return json.loads(row[0])
+
+def put(namespace, key, value):
+    conn = get_connection()
+    now = time.time()
+    conn.execute(
+        "INSERT OR REPLACE INTO entries (namespace, key, value, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+        (namespace, key, json.dumps(value), now, now)
+    )
+    evict(conn)
+
+def evict(conn=None):
+    conn = conn or get_connection()
+    conn.execute("DELETE FROM entries WHERE created_at < ?", (time.time() - CACHE_TTL_SECONDS,))
+    conn.execute(
+        "DELETE FROM entries WHERE rowid IN (SELECT rowid FROM entries ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+        (CACHE_MAX_ENTRIES,)
+    )
+
+def invalidate(namespace=None, key=None):
+    # No arguments clears everything; a namespace clears that namespace; a namespace and key clear one entry.
+    conn = get_connection()
+    if key is not None:
+        if namespace is None:
+            raise ValueError("invalidate(key=...) needs the namespace the key belongs to.")
+        conn.execute("DELETE FROM entries WHERE namespace = ? AND key = ?", (namespace, key))
+    elif namespace is not None:
+        conn.execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+    else:
+        conn.execute("DELETE FROM entries")
+
+def get_stats():
+    with stats_lock:
+        return {namespace: dict(counters) for namespace, counters in stats.items()}
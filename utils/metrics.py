@@ -0,0 +1,220 @@
+#metrics
+
+import contextlib
+import functools
+import json
+import os
+import threading
+import time
+
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "1") == "1"
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9464"))
+TRACE_DIR = 'data'
+TRACE_FILE = os.path.join(TRACE_DIR, 'trace.jsonl')
+# The trace is rotated to trace.jsonl.1 once it grows past this.
+TRACE_MAX_BYTES = float(os.getenv("METRICS_TRACE_MAX_MB", "50")) * 1024 * 1024
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+trace_lock = threading.Lock()
+trace = {"handle": None, "pid": None}
+
+# --- Recording: every process (Streamlit, job workers, bulk ingest) appends to the same trace file ---
+
+def _open_trace():
+    # Reopens after a fork, or when another process has rotated the file out from under us.
+    handle = trace["handle"]
+    if handle is not None and trace["pid"] == os.getpid():
+        try:
+            if os.stat(TRACE_FILE).st_ino == os.fstat(handle.fileno()).st_ino:
+                return handle
+        except OSError:
+            pass
+        handle.close()
+    os.makedirs(TRACE_DIR, exist_ok=True)
+    trace["handle"] = open(TRACE_FILE, "a", encoding="utf-8")
+    trace["pid"] = os.getpid()
+    return trace["handle"]
+
+def write_event(event):
+    if not METRICS_ENABLED:
+        return
+    line = json.dumps(event, default=str) + "\n"
+    with trace_lock:
+        try:
+            handle = _open_trace()
+            # One write per line; appends this small don't interleave between processes.
+            handle.write(line)
+            handle.flush()
+            if handle.tell() > TRACE_MAX_BYTES:
+                os.replace(TRACE_FILE, TRACE_FILE + ".1")
+        except OSError as e:
+            print(f"Could not write trace event: {e}")
+
+@contextlib.contextmanager
+def span(stage, **attrs):
+    # Times the block; the yielded dict can be filled with extra fields, and "ok": False marks a failure
+    # that didn't raise (e.g. an error string returned by Mineru).
+    started_at = time.time()
+    start = time.perf_counter()
+    ok = True
+    try:
+        yield attrs
+    except BaseException:
+        ok = False
+        raise
+    finally:
+        write_event({
+            "type": "span", "ts": round(started_at, 3), "stage": stage,
+            "duration": round(time.perf_counter() - start, 6), "ok": ok, "pid": os.getpid(), **attrs,
+        })
+
+def timed(stage):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def count(name, value=1, **labels):
+    if value:
+        write_event({"type": "count", "ts": round(time.time(), 3), "name": name, "value": value, "labels": labels})
+
+def read_events(since=None):
+    # All events from the rotated and current trace files, oldest first.
+    events = []
+    for path in (TRACE_FILE + ".1", TRACE_FILE):
+        if not os.path.exists(path):
+            continue
+        with open(path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    event = json.loads(line)
+                except json.JSONDecodeError:
+                    # A line still being written by another process.
+                    continue
+                if since is None or event.get("ts", 0) >= since:
+                    events.append(event)
+    return events
+
+# --- Prometheus endpoint: aggregates the trace file incrementally, so it covers every process ---
+
+aggregate_lock = threading.Lock()
+aggregate = {"inode": None, "offset": 0, "stages": {}, "failures": {}, "tokens": {}, "counters": {}}
+
+def _add_event(event):
+    if event.get("type") == "span":
+        stage = event["stage"]
+        histogram = aggregate["stages"].setdefault(stage, {"buckets": [0] * len(BUCKETS), "sum": 0.0, "count": 0})
+        duration = event.get("duration", 0.0)
+        for i, bound in enumerate(BUCKETS):
+            if duration <= bound:
+                histogram["buckets"][i] += 1
+        histogram["sum"] += duration
+        histogram["count"] += 1
+        if not event.get("ok", True):
+            aggregate["failures"][stage] = aggregate["failures"].get(stage, 0) + 1
+        for direction in ("prompt", "response"):
+            tokens = event.get(f"{direction}_tokens")
+            if tokens:
+                aggregate["tokens"][direction] = aggregate["tokens"].get(direction, 0) + tokens
+    elif event.get("type") == "count":
+        key = (event["name"], tuple(sorted((event.get("labels") or {}).items())))
+        aggregate["counters"][key] = aggregate["counters"].get(key, 0) + event.get("value", 0)
+
+def refresh_aggregate():
+    with aggregate_lock:
+        try:
+            stat = os.stat(TRACE_FILE)
+        except OSError:
+            return
+        if stat.st_ino != aggregate["inode"] or stat.st_size < aggregate["offset"]:
+            # Rotated: start on the new file (events written to the old one since the last scrape are skipped).
+            aggregate["inode"], aggregate["offset"] = stat.st_ino, 0
+        with open(TRACE_FILE, "rb") as f:
+            f.seek(aggregate["offset"])
+            data = f.read()
+        # Leave a trailing partial line for the next scrape.
+        complete = data[:data.rfind(b"\n") + 1]
+        aggregate["offset"] += len(complete)
+        for line in complete.splitlines():
+            try:
+                _add_event(json.loads(line))
+            except (json.JSONDecodeError, KeyError, TypeError):
+                continue
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def _labels(**labels):
+    return "{" + ",".join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + "}"
+
+def render_prometheus():
+    refresh_aggregate()
+    lines = [
+        "# HELP qc_stage_duration_seconds Time spent in each stage of the QC workflow.",
+        "# TYPE qc_stage_duration_seconds histogram",
+    ]
+    with aggregate_lock:
+        for stage, histogram in sorted(aggregate["stages"].items()):
+            for bound, value in zip(BUCKETS, histogram["buckets"]):
+                lines.append(f"qc_stage_duration_seconds_bucket{_labels(stage=stage, le=bound)} {value}")
+            lines.append(f"qc_stage_duration_seconds_bucket{_labels(stage=stage, le='+Inf')} {histogram['count']}")
+            lines.append(f"qc_stage_duration_seconds_sum{_labels(stage=stage)} {histogram['sum']:.6f}")
+            lines.append(f"qc_stage_duration_seconds_count{_labels(stage=stage)} {histogram['count']}")
+        lines += ["# HELP qc_stage_failures_total Stage runs that raised or reported an error.",
+                  "# TYPE qc_stage_failures_total counter"]
+        lines += [f"qc_stage_failures_total{_labels(stage=stage)} {value}" for stage, value in sorted(aggregate["failures"].items())]
+        lines += ["# HELP qc_gemini_tokens_total Gemini tokens reported by the API.",
+                  "# TYPE qc_gemini_tokens_total counter"]
+        lines += [f"qc_gemini_tokens_total{_labels(direction=direction)} {value}" for direction, value in sorted(aggregate["tokens"].items())]
+        typed = set()
+        for (name, labels), value in sorted(aggregate["counters"].items()):
+            if name not in typed:
+                lines.append(f"# TYPE qc_{name}_total counter")
+                typed.add(name)
+            lines.append(f"qc_{name}_total{_labels(**dict(labels))} {value}")
+    return "\n".join(lines) + "\n"
+
+def _handler_class():
+    # http.server is imported only by the process that actually serves the endpoint.
+    from http.server import BaseHTTPRequestHandler
+
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render_prometheus().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return MetricsHandler
+
+server_lock = threading.Lock()
+server_state = {"server": None, "attempted": False}
+
+def start_server(port=METRICS_PORT):
+    # Cheap to call on every rerun. If the port is taken, another process on this host is already
+    # serving the same trace file.
+    with server_lock:
+        if server_state["attempted"] or not METRICS_ENABLED:
+            return server_state["server"]
+        server_state["attempted"] = True
+        from http.server import ThreadingHTTPServer
+        try:
+            server = ThreadingHTTPServer((METRICS_HOST, port), _handler_class())
+        except OSError:
+            return None
+        threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+        server_state["server"] = server
+        print(f"Prometheus metrics available at http://{METRICS_HOST}:{port}/metrics")
+        return server
@@ -0,0 +1,241 @@
+#mineru_server
+
+import argparse
+import os
+import secrets
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client, Listener
+
+WORKER_ENABLED = os.getenv("MINERU_WORKER", "1") == "1"
+WORKER_HOST = '127.0.0.1'
+WORKER_PORT = int(os.getenv("MINERU_WORKER_PORT", "47631"))
+# Random per-host key that both sides of the connection must prove they hold. It lives in a file only this
+# user can read, so other local users can neither run pickles inside the worker nor impersonate it.
+WORKER_KEY_FILE = os.path.abspath(os.getenv("MINERU_WORKER_KEY_FILE", os.path.join('data', 'mineru_worker.key')))
+# The worker is restarted once its resident memory passes this, or after this many documents.
+WORKER_MAX_RSS_MB = float(os.getenv("MINERU_WORKER_MAX_RSS_MB", "6144"))
+WORKER_MAX_DOCUMENTS = int(os.getenv("MINERU_WORKER_MAX_DOCUMENTS", "500"))
+WORKER_STARTUP_TIMEOUT = float(os.getenv("MINERU_WORKER_STARTUP_TIMEOUT", "300"))
+# After a failed start, use the CLI for this long before trying the worker again.
+WORKER_RETRY_COOLDOWN = 300
+SUPPORTED_EXTENSIONS = ('.pdf', '.png', '.jpg', '.jpeg')
+
+class WorkerUnavailable(Exception):
+    pass
+
+class WorkerBusy(WorkerUnavailable):
+    pass
+
+def get_authkey(path=WORKER_KEY_FILE):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    try:
+        fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    except FileExistsError:
+        if sys.platform != "win32" and os.stat(path).st_mode & 0o077:
+            os.chmod(path, 0o600)
+        # Another process may have created the file a moment ago and still be writing it.
+        for _ in range(50):
+            with open(path, 'r', encoding='utf-8') as f:
+                key = f.read().strip()
+            if key:
+                return key.encode('utf-8')
+            time.sleep(0.1)
+        raise WorkerUnavailable(f"The Mineru worker key file {path} is empty.")
+    key = secrets.token_hex(32)
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        f.write(key)
+    return key.encode('utf-8')
+
+# --- Server side: runs in its own long-lived process ---
+
+def get_rss_mb():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / (1024 * 1024)
+    except (OSError, ValueError, AttributeError):
+        return None
+
+def warm_up():
+    # Importing Mineru and building the pipeline models is the startup cost we want to pay only once.
+    from mineru.cli.common import do_parse  # noqa: F401
+    try:
+        from mineru.backend.pipeline.pipeline_analyze import ModelSingleton
+        ModelSingleton().get_model(lang=None, formula_enable=True, table_enable=True)
+    except Exception as e:
+        print(f"Mineru worker: model pre-load skipped ({e}); models load on the first document.")
+
+def convert_paths(input_path, output_dir):
+    from mineru.cli.common import do_parse, read_fn
+
+    if os.path.isdir(input_path):
+        paths = [os.path.join(input_path, name) for name in sorted(os.listdir(input_path))]
+    else:
+        paths = [input_path]
+    paths = [path for path in paths if path.lower().endswith(SUPPORTED_EXTENSIONS)]
+    if not paths:
+        raise ValueError(f"No documents the worker can convert in {input_path}.")
+    # Same layout as the CLI: <output_dir>/<stem>/auto/<stem>.md
+    do_parse(
+        output_dir,
+        [os.path.splitext(os.path.basename(path))[0] for path in paths],
+        [read_fn(path) for path in paths],
+        ["ch"] * len(paths),
+        backend="pipeline",
+        parse_method="auto",
+    )
+    return len(paths)
+
+def handle_connection(conn, convert_lock, state):
+    with conn:
+        while True:
+            try:
+                request = conn.recv()
+            except EOFError:
+                return
+            if request.get("op") == "ping":
+                conn.send({"ok": True, "pid": os.getpid(), "rss_mb": get_rss_mb(), "documents": state["documents"]})
+                continue
+            if request.get("op") == "shutdown":
+                conn.send({"ok": True})
+                os._exit(0)
+            # One conversion at a time (the models aren't shared between threads); other requests are turned
+            # away at once so the caller can use the CLI in parallel instead of queueing behind a long batch.
+            if not convert_lock.acquire(blocking=False):
+                conn.send({"ok": False, "busy": True})
+                continue
+            try:
+                state["documents"] += convert_paths(request["input_path"], request["output_dir"])
+                conn.send({"ok": True, "rss_mb": get_rss_mb(), "documents": state["documents"]})
+            except Exception as e:
+                conn.send({"ok": False, "error": f"{type(e).__name__}: {e}", "rss_mb": get_rss_mb(), "documents": state["documents"]})
+            finally:
+                convert_lock.release()
+
+def serve(port=WORKER_PORT, key_file=WORKER_KEY_FILE):
+    listener = Listener((WORKER_HOST, port), authkey=get_authkey(key_file))
+    warm_up()
+    print(f"Mineru worker {os.getpid()} listening on {WORKER_HOST}:{port}.")
+    convert_lock = threading.Lock()
+    state = {"documents": 0}
+    while True:
+        try:
+            conn = listener.accept()
+        except (AuthenticationError, OSError) as e:
+            # A client without the key (or one that hung up mid-handshake) must not take the worker down.
+            print(f"Mineru worker: rejected a connection ({type(e).__name__}).")
+            continue
+        threading.Thread(target=handle_connection, args=(conn, convert_lock, state), daemon=True).start()
+
+# --- Client side: used by doc_parser in the app and job worker processes ---
+
+class WorkerSupervisor:
+    # Connects to a running worker (shared by every process on the host) or starts one, and replaces it
+    # when it dies or grows past the memory/document limits.
+    def __init__(self, port=WORKER_PORT, key_file=WORKER_KEY_FILE):
+        self.port = port
+        self.key_file = key_file
+        self.authkey = None
+        # Guards connecting and starting the worker only; conversions from several threads run concurrently.
+        self.lock = threading.Lock()
+        self.process = None
+        self.unavailable_until = 0
+
+    def _connect(self):
+        if self.authkey is None:
+            self.authkey = get_authkey(self.key_file)
+        try:
+            return Client((WORKER_HOST, self.port), authkey=self.authkey)
+        except AuthenticationError:
+            # Whatever holds the port doesn't know our key: not our worker.
+            raise WorkerUnavailable(f"Port {self.port} is held by a process that is not this app's Mineru worker.")
+
+    def _start_worker(self):
+        print("Starting persistent Mineru worker...")
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "utils.mineru_server", "--port", str(self.port), "--key-file", self.key_file],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        )
+        deadline = time.monotonic() + WORKER_STARTUP_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                # Exited: Mineru is missing, or another process won the race for the port.
+                break
+            try:
+                return self._connect()
+            except (ConnectionRefusedError, OSError):
+                time.sleep(0.5)
+        try:
+            return self._connect()
+        except (ConnectionRefusedError, OSError):
+            raise WorkerUnavailable("The persistent Mineru worker did not start.")
+
+    def _get_connection(self):
+        if time.monotonic() < self.unavailable_until:
+            raise WorkerUnavailable("The persistent Mineru worker is cooling down after a failed start.")
+        try:
+            return self._connect()
+        except (ConnectionRefusedError, OSError):
+            pass
+        try:
+            return self._start_worker()
+        except WorkerUnavailable:
+            self.unavailable_until = time.monotonic() + WORKER_RETRY_COOLDOWN
+            raise
+
+    def _recycle_if_needed(self, conn, reply):
+        rss_mb = reply.get("rss_mb")
+        if (rss_mb is not None and rss_mb > WORKER_MAX_RSS_MB) or reply.get("documents", 0) >= WORKER_MAX_DOCUMENTS:
+            print(f"Recycling Mineru worker (rss={rss_mb} MB, documents={reply.get('documents')}).")
+            try:
+                conn.send({"op": "shutdown"})
+                conn.recv()
+            except (EOFError, OSError):
+                pass
+
+    def convert(self, input_path, output_dir):
+        # Returns None on success or an error message; raises WorkerBusy if the worker is converting something
+        # else, and WorkerUnavailable if it can't be reached.
+        for attempt in range(2):
+            with self.lock:
+                conn = self._get_connection()
+            try:
+                conn.send({"op": "convert", "input_path": os.path.abspath(input_path), "output_dir": os.path.abspath(output_dir)})
+                reply = conn.recv()
+            except (EOFError, OSError):
+                # The worker crashed mid-request; the next attempt starts a fresh one.
+                conn.close()
+                continue
+            if reply.get("busy"):
+                conn.close()
+                raise WorkerBusy("The persistent Mineru worker is busy with another document.")
+            self._recycle_if_needed(conn, reply)
+            conn.close()
+            return None if reply.get("ok") else f"Mineru worker failed to process the file.\nError: {reply.get('error')}"
+        raise WorkerUnavailable("The persistent Mineru worker crashed twice on this request.")
+
+supervisor = WorkerSupervisor()
+
+def worker_supports(input_path):
+    if os.path.isdir(input_path):
+        names = os.listdir(input_path)
+        return bool(names) and all(name.lower().endswith(SUPPORTED_EXTENSIONS) for name in names)
+    return input_path.lower().endswith(SUPPORTED_EXTENSIONS)
+
+def convert_with_worker(input_path, output_dir):
+    if not WORKER_ENABLED:
+        raise WorkerUnavailable("The persistent Mineru worker is disabled (MINERU_WORKER=0).")
+    return supervisor.convert(input_path, output_dir)
+
+def main():
+    parser = argparse.ArgumentParser(description="Long-lived Mineru conversion worker.")
+    parser.add_argument("--port", type=int, default=WORKER_PORT)
+    parser.add_argument("--key-file", default=WORKER_KEY_FILE)
+    args = parser.parse_args()
+    serve(args.port, args.key_file)
+
+if __name__ == "__main__":
+    main()
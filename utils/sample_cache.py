@@ -0,0 +1,90 @@
+#sample_cache
+
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from utils import db
+
+# Writes from other processes are noticed within this many seconds; writes from this process immediately.
+CHANGE_POLL_SECONDS = float(os.getenv("SAMPLE_CHANGE_POLL_SECONDS", "1"))
+MAX_CACHED_QUERIES = 256
+MAX_CACHED_SAMPLES = 5000
+
+# One cache per server process, shared by every Streamlit session. Cached values are shared objects:
+# callers must treat them as read-only.
+cache_lock = threading.Lock()
+state = {"seq": None, "checked_at": 0.0, "queries": OrderedDict(), "samples": OrderedDict()}
+
+def _apply_change(seq, changed_ids):
+    # changed_ids: ids to drop from the per-sample cache, or None to drop all of it.
+    with cache_lock:
+        if state["seq"] is not None and seq < state["seq"]:
+            # The store went backwards (restored or recreated): nothing cached can be trusted.
+            changed_ids = None
+        elif state["seq"] == seq:
+            state["checked_at"] = time.monotonic()
+            return seq
+        state["queries"].clear()
+        if changed_ids is None:
+            state["samples"].clear()
+        else:
+            for sample_id in changed_ids:
+                state["samples"].pop(sample_id, None)
+        state["seq"] = seq
+        state["checked_at"] = time.monotonic()
+        return seq
+
+def refresh():
+    with cache_lock:
+        previous = state["seq"]
+    if previous is None:
+        return _apply_change(db.get_change_seq(), None)
+    # Only the samples that actually changed are evicted; cached query results always are.
+    return _apply_change(*db.get_changes_since(previous))
+
+def current_seq():
+    # Version of the sample store. Checked against the database at most once per CHANGE_POLL_SECONDS
+    # however many dashboards are open, so idle sessions cost next to nothing.
+    with cache_lock:
+        if state["seq"] is not None and time.monotonic() - state["checked_at"] < CHANGE_POLL_SECONDS:
+            return state["seq"]
+    return refresh()
+
+def _on_local_write(seq):
+    # Writes made in this process bypass the poll interval.
+    with cache_lock:
+        state["checked_at"] = 0.0
+
+db.change_listeners.append(_on_local_write)
+
+def _cached(table, key, limit, loader):
+    seq = current_seq()
+    with cache_lock:
+        # Entries still present are current: _apply_change evicts everything a change could affect.
+        if key in state[table]:
+            state[table].move_to_end(key)
+            return state[table][key]
+    value = loader()
+    with cache_lock:
+        # A result loaded while the store moved on is returned but not kept.
+        if state["seq"] == seq:
+            state[table][key] = value
+            while len(state[table]) > limit:
+                state[table].popitem(last=False)
+    return value
+
+def query_samples(**kwargs):
+    key = tuple(sorted(kwargs.items()))
+    return _cached("queries", ("query_samples", key), MAX_CACHED_QUERIES, lambda: db.query_samples(**kwargs))
+
+def count_samples(**kwargs):
+    key = tuple(sorted(kwargs.items()))
+    return _cached("queries", ("count_samples", key), MAX_CACHED_QUERIES, lambda: db.count_samples(**kwargs))
+
+def get_material_names(status=None):
+    return _cached("queries", ("get_material_names", status), MAX_CACHED_QUERIES, lambda: db.get_material_names(status))
+
+def get_sample(sample_id):
+    return _cached("samples", sample_id, MAX_CACHED_SAMPLES, lambda: db.get_sample(sample_id))
@@ -0,0 +1,268 @@
+#spec_tables
+
+import html
+import json
+import re
+
+TABLE_PATTERN = re.compile(r"<table\b.*?</table>", re.IGNORECASE | re.DOTALL)
+ROW_PATTERN = re.compile(r"<tr\b.*?</tr>", re.IGNORECASE | re.DOTALL)
+TAG_PATTERN = re.compile(r"<[^>]+>")
+SPEC_HEADER_PATTERN = re.compile(r"specification|name of (the )?test|\btests?\b|limits?|acceptance criteria", re.IGNORECASE)
+FIELD_PATTERN = r'"{}"\s*:\s*"((?:[^"\\]|\\.)*)"'
+CELL_PATTERN = re.compile(r"<t[dh]\b[^>]*>(.*?)</t[dh]>", re.IGNORECASE | re.DOTALL)
+NAME_HEADER_PATTERN = re.compile(r"name of (the )?tests?|^tests?$|^test parameters?$|^parameters?$|^characteristics?$|^tests? name$", re.IGNORECASE)
+SPEC_COLUMN_PATTERN = re.compile(r"specifications?|^limits?$|acceptance criteria", re.IGNORECASE)
+MATERIAL_LABEL_PATTERN = re.compile(r"^(material|product|item)( name)?$", re.IGNORECASE)
+MATERIAL_LINE_PATTERN = re.compile(r"(?:material|product)(?: name)?\s*[:\-–]\s*([^\n<|]+)", re.IGNORECASE)
+HEADING_PATTERN = re.compile(r"^#+\s*(.+?)\s*#*$", re.MULTILINE)
+HEADING_NOISE_PATTERN = re.compile(r"\b(raw material |finished product |in-?process )?specifications?( sheet)?( of| for)?\b[:\-–]?", re.IGNORECASE)
+STAGE_PATTERN = re.compile(r"\bstage\s*(?:no\.?)?\s*[:\-–]?\s*([A-Za-z]{0,3}\d+[A-Za-z0-9\-]*)", re.IGNORECASE)
+STAGE_SUFFIX_PATTERN = re.compile(r"\(([A-Z]{1,3}\d{0,2})\)\s*$")
+
+NUMBER = r"([-+]?(?:\d+(?:\.\d+)?|\.\d+))"
+UNIT = r"(?:\s*(?:%\s*(?:w/w|v/v|w/v|m/m)?|ppm|ppb|mg/kg|mg/ml|mg|g/ml|g/cm3|g|ml|°\s*c|cps?|mpa\s*\.?\s*s|µs/cm|us/cm|ntu))?"
+RANGE_PATTERN = re.compile(rf"^(?:between\s+)?{NUMBER}{UNIT}\s*(?:–|—|-|to|and)\s*{NUMBER}{UNIT}$")
+MAX_PATTERN = re.compile(rf"^(?:nmt|not more than|max(?:imum)?\.?|≤|<=|up ?to)\s*:?\s*{NUMBER}{UNIT}$|^{NUMBER}{UNIT}\s*max(?:imum)?\.?$")
+MIN_PATTERN = re.compile(rf"^(?:nlt|not less than|min(?:imum)?\.?|≥|>=)\s*:?\s*{NUMBER}{UNIT}$|^{NUMBER}{UNIT}\s*min(?:imum)?\.?$")
+
+MAX_CONTEXT_CHARS = 1500
+MAX_CHUNK_CHARS = 12000
+
+def strip_tags(markup):
+    return TAG_PATTERN.sub(" ", markup)
+
+def find_spec_tables(markdown_text):
+    # Tables from the first one whose first rows look like a specification header; all tables if none do.
+    # Header-less tables after it are kept: Mineru splits a spec table at each page break.
+    tables = TABLE_PATTERN.findall(markdown_text)
+    for index, table in enumerate(tables):
+        rows = ROW_PATTERN.findall(table)
+        header_text = strip_tags(" ".join(rows[:2]) if rows else table[:500])
+        if SPEC_HEADER_PATTERN.search(header_text):
+            return tables[index:]
+    return tables
+
+def get_document_context(markdown_text):
+    # Headings and text before the first table usually carry the material name, stage and document number.
+    first_table = TABLE_PATTERN.search(markdown_text)
+    preamble = markdown_text[:first_table.start()] if first_table else markdown_text
+    return preamble.strip()[:MAX_CONTEXT_CHARS]
+
+def split_table(table, max_chars=MAX_CHUNK_CHARS):
+    if len(table) <= max_chars:
+        return [table]
+    rows = ROW_PATTERN.findall(table)
+    if len(rows) < 2:
+        return [table]
+    # Every chunk repeats the header row so the model still knows which column is which.
+    header, body = rows[0], rows[1:]
+    chunks, current, current_len = [], [], len(header)
+    for row in body:
+        if current and current_len + len(row) > max_chars:
+            chunks.append(f"<table>{header}{''.join(current)}</table>")
+            current, current_len = [], len(header)
+        current.append(row)
+        current_len += len(row)
+    if current:
+        chunks.append(f"<table>{header}{''.join(current)}</table>")
+    return chunks
+
+def build_extraction_sections(markdown_text, max_chars=MAX_CHUNK_CHARS):
+    # Returns the document text to send to the model, one string per chunk.
+    context = get_document_context(markdown_text)
+    tables = find_spec_tables(markdown_text)
+    if not tables:
+        body = markdown_text.strip()
+        return [body[start:start + max_chars] for start in range(0, len(body), max_chars)] or [""]
+    sections = []
+    for table in tables:
+        for chunk in split_table(table, max_chars):
+            sections.append(f"{context}\n\n{chunk}" if context else chunk)
+    return sections
+
+def salvage_extraction(response_text):
+    # Best-effort recovery from truncated or malformed JSON: keep every complete parameter object.
+    decoder = json.JSONDecoder()
+    result = {"parameters": []}
+    for field in ("material", "stage"):
+        match = re.search(FIELD_PATTERN.format(field), response_text)
+        if match:
+            result[field] = json.loads(f'"{match.group(1)}"')
+    start = response_text.find('"parameters"')
+    start = response_text.find('[', start) if start != -1 else -1
+    if start == -1:
+        return result
+    position = start + 1
+    while position < len(response_text):
+        while position < len(response_text) and response_text[position] in " \t\r\n,":
+            position += 1
+        if position >= len(response_text) or response_text[position] != '{':
+            break
+        try:
+            item, position = decoder.raw_decode(response_text, position)
+        except json.JSONDecodeError:
+            break
+        if isinstance(item, dict) and item.get('name'):
+            result["parameters"].append(item)
+    return result
+
+def merge_extractions(extractions):
+    merged = {"material": None, "stage": None, "parameters": []}
+    seen = set()
+    for extraction in extractions:
+        for field in ("material", "stage"):
+            if not merged[field] and extraction.get(field):
+                merged[field] = extraction[field]
+        for param in extraction.get('parameters') or []:
+            key = (param.get('name'), param.get('spec'))
+            if key not in seen:
+                seen.add(key)
+                merged["parameters"].append(param)
+    return merged
+
+def parse_row(row_html):
+    return [" ".join(html.unescape(strip_tags(cell)).split()) for cell in CELL_PATTERN.findall(row_html)]
+
+def find_columns(table_cells):
+    # (header row index, name column, spec column) from the first few rows, or None.
+    for row_index, cells in enumerate(table_cells[:3]):
+        name_col = next((i for i, cell in enumerate(cells) if NAME_HEADER_PATTERN.search(cell)), None)
+        spec_col = next((i for i, cell in enumerate(cells) if SPEC_COLUMN_PATTERN.search(cell) and i != name_col), None)
+        if name_col is not None and spec_col is not None:
+            return row_index, name_col, spec_col
+    return None
+
+def to_number(text):
+    value = float(text)
+    return int(value) if value.is_integer() and '.' not in text else value
+
+def classify_spec(spec_text):
+    # Returns {"type", "min"/"max"} for the spec layouts we recognise, or None if the model should decide.
+    text = " ".join(spec_text.lower().split())
+    if not text:
+        return None
+    if not re.search(r"\d", text):
+        return {"type": "text"}
+    match = RANGE_PATTERN.match(text)
+    if match:
+        low, high = to_number(match.group(1)), to_number(match.group(2))
+        return {"type": "numeric_range", "min": low, "max": high} if low <= high else None
+    match = MAX_PATTERN.match(text)
+    if match:
+        return {"type": "numeric_max", "max": to_number(match.group(1) or match.group(2))}
+    match = MIN_PATTERN.match(text)
+    if match:
+        return {"type": "numeric_min", "min": to_number(match.group(1) or match.group(2))}
+    return None
+
+def find_material_and_stage(markdown_text):
+    material = None
+    for row in ROW_PATTERN.findall(markdown_text):
+        cells = parse_row(row)
+        for i, cell in enumerate(cells[:-1]):
+            if MATERIAL_LABEL_PATTERN.match(cell.rstrip(": ")) and cells[i + 1]:
+                material = cells[i + 1]
+                break
+        if material:
+            break
+    if not material:
+        match = MATERIAL_LINE_PATTERN.search(strip_tags(markdown_text))
+        if match:
+            material = match.group(1).strip()
+    if not material:
+        for heading in HEADING_PATTERN.findall(markdown_text):
+            candidate = HEADING_NOISE_PATTERN.sub("", heading).strip(" :-–")
+            if candidate:
+                material = candidate
+                break
+    stage = None
+    match = STAGE_PATTERN.search(strip_tags(markdown_text))
+    if match:
+        stage = match.group(1)
+    elif material:
+        match = STAGE_SUFFIX_PATTERN.search(material)
+        if match:
+            stage = match.group(1)
+    return material, stage
+
+def extract_specs_locally(markdown_text, max_chars=MAX_CHUNK_CHARS):
+    # Returns (extraction, llm_sections). Rows the local rules can't classify stay in the
+    # extraction with "type": None, and their source rows are in llm_sections for the model.
+    material, stage = find_material_and_stage(markdown_text)
+    extraction = {"material": material, "stage": stage, "parameters": []}
+    if not TABLE_PATTERN.search(markdown_text):
+        return extraction, build_extraction_sections(markdown_text, max_chars)
+
+    context = get_document_context(markdown_text)
+    llm_sections = []
+    # The header of the last table with recognisable columns, for tables that continue it after a page break.
+    layout = None
+    for table in find_spec_tables(markdown_text):
+        rows = ROW_PATTERN.findall(table)
+        table_cells = [parse_row(row) for row in rows]
+        columns = find_columns(table_cells)
+        if columns is not None:
+            header_index, name_col, spec_col = columns
+            layout = (rows[header_index], len(table_cells[header_index]), name_col, spec_col)
+            body = list(zip(rows[header_index + 1:], table_cells[header_index + 1:]))
+        elif layout is not None and table_cells and len(table_cells[0]) == layout[1]:
+            # Same column count as the table above and no header of its own: a continuation.
+            body = list(zip(rows, table_cells))
+        else:
+            # Columns not recognised, and not a continuation of the table above: the model reads the whole table.
+            llm_sections.extend(f"{context}\n\n{chunk}" if context else chunk for chunk in split_table(table, max_chars))
+            continue
+        header_row, header_cells, name_col, spec_col = layout
+        pending_rows = []
+        previous_row = None
+        for row, cells in body:
+            if not any(cells):
+                continue
+            if len(cells) < header_cells or not cells[name_col] or not cells[spec_col]:
+                # A rowspan continuation (a merged S.No or test name leaves the row short, so its cells no longer
+                # line up with the header) or a row with a blank name or limit: the model reads it, with the row
+                # above for context, rather than it being guessed at or dropped.
+                if previous_row is not None and previous_row not in pending_rows:
+                    pending_rows.append(previous_row)
+                pending_rows.append(row)
+                previous_row = row
+                continue
+            previous_row = row
+            name, spec = cells[name_col], cells[spec_col]
+            classified = classify_spec(spec)
+            extraction["parameters"].append({"name": name, "spec": spec, **(classified or {"type": None})})
+            if classified is None:
+                pending_rows.append(row)
+        if pending_rows:
+            pending_table = f"<table>{header_row}{''.join(pending_rows)}</table>"
+            llm_sections.extend(f"{context}\n\n{chunk}" if context else chunk for chunk in split_table(pending_table, max_chars))
+    return extraction, llm_sections
+
+def resolve_pending(extraction, llm_extraction):
+    # Fill unclassified rows from the model's output (matched by name). Rows the model missed keep "type": None:
+    # they may be numeric limits, so they are classified by hand rather than guessed as text.
+    llm_params = {" ".join(str(p.get('name', '')).lower().split()): p for p in llm_extraction.get('parameters') or []}
+    local_names = set()
+    parameters = []
+    for param in extraction['parameters']:
+        key = " ".join(param['name'].lower().split())
+        local_names.add(key)
+        if param['type'] is None:
+            param = llm_params.get(key) or param
+        parameters.append(param)
+    # Parameters from tables that had no recognisable columns were never parsed locally.
+    parameters.extend(p for key, p in llm_params.items() if key not in local_names)
+    return {
+        "material": extraction.get('material') or llm_extraction.get('material'),
+        "stage": extraction.get('stage') or llm_extraction.get('stage'),
+        "parameters": parameters,
+    }
+
+def classify_manually(param, limit_text):
+    # Classification entered on the Production form: "text", or a limit in a layout classify_spec recognises.
+    if limit_text.strip().lower() == "text":
+        return {**param, "type": "text"}
+    classified = classify_spec(limit_text)
+    if classified is None or classified["type"] == "text":
+        return None
+    return {**param, **classified}
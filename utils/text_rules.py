@@ -0,0 +1,97 @@
+#text_rules
+
+import os
+import re
+import sqlite3
+import threading
+import time
+
+from utils import llm_cache, metrics
+
+# Observations that on their own just confirm compliance with the specification.
+CONFIRMATION_PATTERN = re.compile(
+    r"^(ok|okay|yes|y|done|same|matches|matching|pass|passed|passes|complies|complied|comply|conforms|conform|"
+    r"satisfactory|as per spec|as per specification|as per specifications|within limit|within limits|"
+    r"meets spec|meets specification|meets the specification|confirmed|correct)$"
+)
+PUNCTUATION_PATTERN = re.compile(r"[^\w\s%.]|(?<!\d)\.|\.(?!\d)")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+# Observations the model accepted, kept apart from the LLM cache: they don't expire, and don't compete with
+# cached extractions and summaries for the cache's entry limit.
+LEARNED_DIR = 'data'
+LEARNED_FILE = os.path.join(LEARNED_DIR, 'accepted_observations.db')
+
+_local = threading.local()
+stats_lock = threading.Lock()
+stats = {"local": 0, "llm": 0}
+
+def get_connection():
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        os.makedirs(LEARNED_DIR, exist_ok=True)
+        conn = sqlite3.connect(LEARNED_FILE, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS accepted (key TEXT PRIMARY KEY, material TEXT NOT NULL, accepted_at REAL NOT NULL)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_accepted_material ON accepted(material)")
+        _import_from_llm_cache(conn)
+        _local.conn = conn
+    return conn
+
+def _import_from_llm_cache(conn):
+    # Observations learned while they were stored in the LLM cache; their material was only kept inside the key.
+    cache = llm_cache.get_connection()
+    rows = cache.execute("SELECT key, created_at FROM entries WHERE namespace = 'accepted_observations'").fetchall()
+    if rows:
+        conn.executemany("INSERT OR IGNORE INTO accepted (key, material, accepted_at) VALUES (?, '', ?)", rows)
+        llm_cache.invalidate(namespace="accepted_observations")
+
+def normalize_text(text):
+    text = PUNCTUATION_PATTERN.sub(" ", str(text).lower())
+    return WHITESPACE_PATTERN.sub(" ", text).strip()
+
+def _learned_key(material, name, spec, observation):
+    return llm_cache.make_key(normalize_text(material), normalize_text(name), normalize_text(spec), normalize_text(observation))
+
+def match_locally(material, name, spec, observation):
+    # Returns (decision, remark) when the observation can be decided without the model, otherwise None.
+    normalized_obs = normalize_text(observation or "")
+    if not normalized_obs:
+        return "Fail", "Input not provided."
+    if CONFIRMATION_PATTERN.match(normalized_obs):
+        return "Pass", f"Observation '{observation}' confirms compliance with the specification."
+    normalized_spec = normalize_text(spec or "")
+    if normalized_obs == normalized_spec or set(normalized_obs.split()) == set(normalized_spec.split()):
+        return "Pass", "Observation matches the specification."
+    if material and get_connection().execute(
+        "SELECT 1 FROM accepted WHERE key = ?", (_learned_key(material, name, spec, observation),)
+    ).fetchone():
+        return "Pass", "Observation matches one previously accepted for this material."
+    return None
+
+def record_accepted(material, name, spec, observation):
+    if material and normalize_text(observation or ""):
+        get_connection().execute(
+            "INSERT OR REPLACE INTO accepted (key, material, accepted_at) VALUES (?, ?, ?)",
+            (_learned_key(material, name, spec, observation), normalize_text(material), time.time())
+        )
+
+def forget_accepted(material=None):
+    # Drops what was learned for one material, or everything; those observations go back to the model.
+    if material is None:
+        get_connection().execute("DELETE FROM accepted")
+    else:
+        get_connection().execute("DELETE FROM accepted WHERE material = ?", (normalize_text(material),))
+
+def count_decisions(local=0, llm=0):
+    with stats_lock:
+        stats["local"] += local
+        stats["llm"] += llm
+    metrics.count("text_decisions", local, source="local")
+    metrics.count("text_decisions", llm, source="llm")
+
+def get_stats():
+    with stats_lock:
+        total = stats["local"] + stats["llm"]
+        return {**stats, "local_fraction": stats["local"] / total if total else 0.0}